@@ -0,0 +1,38 @@
+'''
+    Runs the benchmark suite: `python -m benchmarks [--runs N] [--json FILE] [suite ...]`
+'''
+import argparse
+import json
+
+from benchmarks import bench_callbacks, bench_clips, bench_server, bench_startup
+
+SUITES = {
+    'startup': bench_startup,
+    'clips': bench_clips,
+    'callbacks': bench_callbacks,
+    'server': bench_server,
+}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Benchmark playlist generation and callback throughput')
+    parser.add_argument('suites', nargs='*', metavar='suite', help=f"one of {', '.join(SUITES)} (default: all)")
+    parser.add_argument('--runs', type=int, default=200, help='timed runs per benchmark')
+    parser.add_argument('--json', help='write the results to this file, to compare between deploys')
+    args = parser.parse_args()
+
+    unknown = set(args.suites) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suite {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in args.suites or SUITES:
+        results[name] = SUITES[name].run(args.runs)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
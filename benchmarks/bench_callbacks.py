@@ -0,0 +1,166 @@
+'''
+    Benchmarks Dash callbacks end to end, through the Flask test client
+'''
+import http.client
+from json import dumps, loads
+from typing import Any, Dict, List
+from urllib.parse import urlsplit
+
+from benchmarks.timing import Result, measure, print_results
+from src.app import server
+
+
+class HttpResponse:
+    def __init__(self, status_code: int, data: bytes):
+        self.status_code = status_code
+        self.data = data
+
+    def get_json(self) -> Any:
+        return loads(self.data)
+
+
+class HttpClient:
+    '''
+        Sends requests to a running server over one keep-alive connection, with the `get`/`post` interface of the
+        Flask test client. Not thread-safe, use one client per thread.
+
+        Args:
+            base_url (str): The url the app is served at, e.g. `http://127.0.0.1:8000`
+    '''
+
+    def __init__(self, base_url: str):
+        url = urlsplit(base_url)
+        self.prefix = url.path.rstrip('/')
+        self.connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=60)
+
+    def request(self, method: str, path: str, body: bytes | None = None, headers: Dict[str, str] = {}) -> HttpResponse:
+        for attempt in range(2):
+            try:
+                self.connection.request(method, self.prefix + path, body, headers)
+                response = self.connection.getresponse()
+                return HttpResponse(response.status, response.read())
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                # the server closed an idle keep-alive connection, reconnect once
+                self.connection.close()
+                if attempt:
+                    raise
+
+    def get(self, path: str) -> HttpResponse:
+        return self.request('GET', path)
+
+    def post(self, path: str, json: Any = None) -> HttpResponse:
+        body = dumps(json).encode()
+        return self.request('POST', path, body, {'Content-Type': 'application/json'})
+
+
+class DashClient:
+    '''
+        Calls server-side Dash callbacks the way the browser does, by posting to `_dash-update-component`
+
+        Args:
+            client: A Flask test client, or any client with the same `get`/`post` interface
+    '''
+
+    def __init__(self, client):
+        self.client = client
+        self.dependencies = [
+            d for d in client.get('/_dash-dependencies').get_json()
+            if not d.get('clientside_function')
+        ]
+
+    def find(self, output: str) -> Dict[str, Any]:
+        '''
+            Finds the server-side callback with an output like `{id}.{property}`
+        '''
+        for dependency in self.dependencies:
+            if output in [f"{o['id']}.{o['property']}" for o in self.outputs(dependency)]:
+                return dependency
+        raise KeyError(f'No server-side callback outputs {output}')
+
+    @staticmethod
+    def outputs(dependency: Dict[str, Any]) -> List[Dict[str, str]]:
+        '''
+            Parses the output ids of a callback, e.g. `..video.url@<hash>...player_store.data@<hash>..`
+        '''
+        outputs = []
+        for output in dependency['output'].strip('.').split('...'):
+            id, prop = output.rsplit('.', 1)
+            outputs.append(dict(id=id, property=prop.split('@')[0]))
+        return outputs
+
+    def payload(self, output: str, values: Dict[str, Any], changed: str | None = None) -> Dict[str, Any]:
+        '''
+            Builds the request body for a callback, taking input and state values from `{id}.{property}` keys.
+            The `changed` input triggers the callback, the first input by default.
+        '''
+        dependency = self.find(output)
+
+        def fill(specs):
+            return [dict(**spec, value=values.get(f"{spec['id']}.{spec['property']}")) for spec in specs]
+
+        first = dependency['inputs'][0]
+        changed = changed or f"{first['id']}.{first['property']}"
+        return dict(
+            output=dependency['output'],
+            outputs=self.outputs(dependency),
+            inputs=fill(dependency['inputs']),
+            state=fill(dependency['state']),
+            changedPropIds=[changed],
+        )
+
+    def call(self, output: str, values: Dict[str, Any], changed: str | None = None) -> Dict[str, Any]:
+        response = self.client.post('/_dash-update-component', json=self.payload(output, values, changed))
+        if response.status_code == 204:
+            return {}
+        if response.status_code != 200:
+            raise RuntimeError(f'{output} failed with {response.status_code}: {response.data[:200]!r}')
+        return response.get_json()['response']
+
+
+START = {
+    'start_button.n_clicks': 1,
+    'tenant.value': 'wftda/en',
+    'format.value': 'both',
+    'topics.value': ['penalties', 'pack', 'jammer', 'other'],
+    'options.value': ['intro', 'outro'],
+    'order.value': 'shuffle',
+    'length.value': 'full',
+    'practice_progress.data': {},
+    'quality.value': 'auto',
+    'continuous.checked': False,
+    'player_throughput.data': None,
+    'player_store.data': None,
+    'seed.data': None,
+}
+
+
+def bench_callbacks(runs: int) -> List[Result]:
+    dash = DashClient(server.test_client())
+    results = []
+
+    results.append(measure('GET _dash-layout', lambda: dash.client.get('/_dash-layout'), runs))
+
+    results.append(measure('start_button_click', lambda: dash.call('start_button.children', START), runs))
+
+    player_store = dash.call('start_button.children', START)['player_store']['data']
+
+    def advance():
+        nonlocal player_store
+        response = dash.call('video.url', {
+            'player_ended.data': player_store,
+            'player_store.data': player_store,
+            'player_throughput.data': None,
+        })
+        player_store = response['player_store']['data']
+        if player_store['session'] is None:
+            player_store = dash.call('start_button.children', START)['player_store']['data']
+
+    results.append(measure('play_next_video', advance, runs))
+
+    return results
+
+
+def run(runs: int) -> List[Result]:
+    results = bench_callbacks(runs)
+    print_results('Callbacks (single thread, Flask test client)', results)
+    return results
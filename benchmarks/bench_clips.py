@@ -0,0 +1,87 @@
+'''
+    Benchmarks loading the clip library and building playlists
+'''
+import itertools
+import tempfile
+from pathlib import Path
+from typing import List
+
+from benchmarks.timing import Result, measure, print_results
+from src import manifest
+from src.clips import ClipCatalog, get_clips
+from src.manifest import ManifestEntry
+from src.models import Format, Option, Topic
+
+SCALES = [1, 10, 100, 1000]
+
+
+def scale_entries(entries: List[ManifestEntry], scale: int) -> List[ManifestEntry]:
+    '''
+        Makes a synthetic library `scale` times the size of the real one, by copying every topic clip
+    '''
+    scaled = [e for e in entries if e['topic'] is None]
+    for i in range(scale):
+        for e in entries:
+            if e['topic'] is not None:
+                scaled.append(ManifestEntry(**{**e, 'path': f"{e['path']}.{i}", 'digest': f"{e['digest']}{i}"}))
+    return [ManifestEntry(**{**e, 'id': i}) for i, e in enumerate(scaled)]
+
+
+def combinations() -> List[tuple]:
+    '''
+        Every Format, non-empty set of Topics and set of Options a user can select
+    '''
+    topic_sets = [list(c) for n in range(1, len(Topic) + 1) for c in itertools.combinations(Topic, n)]
+    option_sets = [list(c) for n in range(len(Option) + 1) for c in itertools.combinations(Option, n)]
+    return list(itertools.product(Format, topic_sets, option_sets))
+
+
+def bench_startup(runs: int) -> List[Result]:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'manifest.json'
+
+        def walk():
+            path.unlink(missing_ok=True)
+            manifest.load(path)
+
+        results = [measure('manifest walk (no manifest)', walk, runs, warmup=1)]
+        manifest.write(manifest.scan(), path)
+        results.append(measure('manifest load', lambda: manifest.load(path), runs))
+
+    results.append(measure('get_clips()', get_clips, runs))
+    return results
+
+
+def bench_playlists(runs: int) -> List[Result]:
+    entries = manifest.load()['clips']
+    results = []
+
+    for scale in SCALES:
+        catalog = ClipCatalog(scale_entries(entries, scale))
+        combos = combinations()
+
+        def build_all():
+            for format, topics, options in combos:
+                catalog.get_playlist(format, topics, options)
+
+        result = measure(f'get_playlist x{len(combos)} combos, {scale}x library', build_all, max(1, runs // scale))
+        results.append(result)
+
+        all_topics = measure(
+            f'get_playlist both/all topics, {scale}x library',
+            lambda: catalog.get_playlist(Format.BOTH, Topic.all(), Option.all()),
+            max(10, runs * 10 // scale),
+        )
+        results.append(all_topics)
+
+    return results
+
+
+def run(runs: int) -> List[Result]:
+    startup = bench_startup(runs)
+    print_results('Clip library startup', startup)
+
+    playlists = bench_playlists(runs)
+    print_results('Playlist generation', playlists)
+
+    return startup + playlists
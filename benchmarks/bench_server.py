@@ -0,0 +1,161 @@
+'''
+    Load tests the app under gunicorn, comparing the default sync workers with the threaded workers of
+    `gunicorn.conf.py`
+'''
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+from benchmarks.bench_callbacks import START, DashClient, HttpClient
+from benchmarks.timing import Result, summarize
+
+ROOT = Path(__file__).parent.parent
+
+CLIENTS = [1, 16, 64, 256]
+
+# Worker settings compared by the load test, as gunicorn command line flags
+CONFIGS: Dict[str, List[str]] = {
+    'sync': ['--worker-class', 'sync'],
+    'gthread': [],
+}
+
+
+class LoadResult(Result):
+    clients: int
+    requests_per_second: float
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@contextmanager
+def serve(flags: List[str], workers: int) -> Iterator[str]:
+    '''
+        Runs the app under gunicorn with `gunicorn.conf.py` and the extra `flags`, and yields its url.
+        Sessions are kept in sqlite, so that every worker can continue them.
+    '''
+    port = free_port()
+    tmp = tempfile.TemporaryDirectory()
+    env = dict(
+        os.environ,
+        PLAYLIST_SESSION_BACKEND='sqlite',
+        PLAYLIST_SESSION_PATH=os.path.join(tmp.name, 'sessions.sqlite3'),
+    )
+    process = subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--bind', f'127.0.0.1:{port}',
+            '--workers', str(workers), '--log-level', 'warning', *flags, 'src.app:server',
+        ],
+        cwd=ROOT,
+        env=env,
+    )
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                with socket.create_connection(('127.0.0.1', port), timeout=1):
+                    break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError('gunicorn did not start')
+                time.sleep(0.1)
+        yield f'http://127.0.0.1:{port}'
+    finally:
+        process.send_signal(signal.SIGTERM)
+        process.wait(timeout=30)
+        tmp.cleanup()
+
+
+def practice(url: str, cycles: int, samples: List[float], failures: List[str], ready: threading.Barrier) -> None:
+    '''
+        Plays through practice sessions like a browser does: each Start is followed by `play_next_video` callbacks
+        and a fetch of every clip, for `cycles` callbacks
+    '''
+    dash = DashClient(HttpClient(url))
+    player_store = None
+    ready.wait()
+
+    def timed(fn):
+        start = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - start)
+        return result
+
+    try:
+        for _ in range(cycles):
+            if not player_store or player_store['session'] is None:
+                response = timed(lambda: dash.call('start_button.children', START))
+            else:
+                response = timed(lambda: dash.call('video.url', {
+                    'player_ended.data': player_store,
+                    'player_store.data': player_store,
+                    'player_throughput.data': None,
+                }))
+            player_store = response['player_store']['data']
+            if response['video']['url']:
+                timed(lambda: dash.client.get('/' + response['video']['url']))
+    except Exception as e:
+        failures.append(repr(e))
+
+
+def load(name: str, url: str, clients: int, cycles: int) -> LoadResult:
+    samples: List[float] = []
+    failures: List[str] = []
+    ready = threading.Barrier(clients + 1)
+    threads = [
+        threading.Thread(target=practice, args=(url, cycles, samples, failures, ready))
+        for _ in range(clients)
+    ]
+    for thread in threads:
+        thread.start()
+
+    ready.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    if failures:
+        print(f'{name}: {len(failures)} of {clients} clients failed, e.g. {failures[0]}', file=sys.stderr)
+
+    return LoadResult(
+        **summarize(name, samples),
+        clients=clients,
+        requests_per_second=len(samples) / elapsed,
+    )
+
+
+def print_load_results(title: str, results: List[LoadResult]) -> None:
+    width = max(len(r['name']) for r in results)
+    print(f'\n{title}')
+    print(f"{'':{width}}  {'clients':>7} {'requests':>8} {'req/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+    for r in results:
+        print(
+            f"{r['name']:{width}}  {r['clients']:>7} {r['runs']:>8} {r['requests_per_second']:>9.0f} "
+            f"{r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} {r['p99_ms']:>9.3f} {r['max_ms']:>9.3f}"
+        )
+
+
+def run(runs: int) -> List[LoadResult]:
+    workers = int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1))
+    results = []
+
+    for config, flags in CONFIGS.items():
+        with serve(flags, workers) as url:
+            for clients in CLIENTS:
+                cycles = max(1, runs * 4 // clients)
+                results.append(load(f'{config} x{workers}', url, clients, cycles))
+
+    print_load_results('Server load (gunicorn, one Start then play_next_video and a clip fetch per cycle)', results)
+    return results
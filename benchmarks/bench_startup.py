@@ -0,0 +1,73 @@
+'''
+    Measures how long a worker takes to boot, in fresh processes: importing `src.app`, importing the components,
+    loading the clip catalog and building the app, and which packages the imports spend the most time in
+'''
+import json
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from benchmarks.timing import Result, print_results, summarize
+
+ROOT = Path(__file__).parent.parent
+
+# Times each stage of a worker boot, printing the durations in seconds as json
+BOOT = '''
+import json, time
+stages = {}
+start = time.perf_counter()
+import src.app
+stages['import src.app'] = time.perf_counter() - start
+start = time.perf_counter()
+import src.layout
+stages['import components'] = time.perf_counter() - start
+start = time.perf_counter()
+from src.clips import get_catalog
+get_catalog()
+stages['load catalog'] = time.perf_counter() - start
+start = time.perf_counter()
+src.app.create_app()
+stages['create_app (rest)'] = time.perf_counter() - start
+print(json.dumps(stages))
+'''
+
+
+def boot(*flags: str) -> subprocess.CompletedProcess:
+    return subprocess.run([sys.executable, *flags, '-c', BOOT], cwd=ROOT, capture_output=True, text=True, check=True)
+
+
+def import_breakdown(output: str) -> List[Tuple[str, float]]:
+    '''
+        Sums the self time of every import by top-level package, from the output of `python -X importtime`
+    '''
+    totals: Dict[str, float] = defaultdict(float)
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        totals[name.strip().split('.')[0]] += int(self_us) / 1000
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+
+def run(runs: int) -> List[Result]:
+    samples: Dict[str, List[float]] = defaultdict(list)
+    for _ in range(max(3, min(runs, 10))):
+        stages = json.loads(boot().stdout.splitlines()[-1])
+        for stage, seconds in stages.items():
+            samples[stage].append(seconds)
+        samples['total'].append(sum(stages.values()))
+
+    results = [summarize(stage, s) for stage, s in samples.items()]
+    print_results('Worker boot (fresh process per run)', results)
+
+    breakdown = import_breakdown(boot('-X', 'importtime').stderr)
+    total = sum(ms for _, ms in breakdown)
+    width = max(len(package) for package, _ in breakdown[:15])
+    print('\nImport time by package')
+    print(f"{'':{width}}  {'ms':>9} {'share':>6}")
+    for package, ms in breakdown[:15]:
+        print(f'{package:{width}}  {ms:>9.1f} {ms / total:>6.0%}')
+
+    return results
@@ -0,0 +1,206 @@
+'''
+    Simulates users practicing at the same time, and reports the latency and rate of every request type:
+
+    `python -m benchmarks.load [--users N] [--duration S] [--speed X] [--url URL | --gunicorn CLASS] [--json FILE]`
+
+    Each user loads the page, picks random selections, clicks Start, then watches every clip, answers most of them and
+    advances with `play_next_video` until the session finishes, sometimes restarting early or opening the contact form.
+    The Player's `currentTime` updates, the contact form and view changes run in the browser, so they only take up the
+    user's time and send no requests.
+'''
+import argparse
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from contextlib import nullcontext
+from functools import partial
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.bench_callbacks import START, DashClient, HttpClient
+from benchmarks.bench_server import CONFIGS, LoadResult, print_load_results, serve
+from benchmarks.timing import summarize
+from src.app import server
+from src.models import Format, Length, Option, Order, Topic
+
+# Seconds a user spends on each clip at `--speed 1`, watching it and then answering
+CLIP_SECONDS = (4.0, 8.0)
+ANSWER_SECONDS = (0.5, 2.0)
+
+# Chances that a user does each of these on a given clip
+ANSWER_CHANCE = 0.8
+RESTART_CHANCE = 0.02
+CONTACT_CHANCE = 0.01
+
+
+class User(threading.Thread):
+    '''
+        One simulated user, recording the duration of every request it sends by request type
+
+        Args:
+            connect (Callable): Makes a client with the Flask test client interface
+            samples (Dict[str, List[float]]): Where request durations are recorded, shared by all users
+            stop (threading.Event): Set when the test is over
+            speed (float): How many times faster than real time the user watches clips
+            seed (int): Seeds the user's choices, so that runs are repeatable
+    '''
+
+    def __init__(
+        self,
+        connect: Callable[[], object],
+        samples: Dict[str, List[float]],
+        stop: threading.Event,
+        speed: float,
+        seed: int
+    ):
+        super().__init__(daemon=True)
+        self.connect = connect
+        self.samples = samples
+        self.stop = stop
+        self.speed = speed
+        self.rng = random.Random(seed)
+        self.errors: List[str] = []
+
+    def timed(self, name: str, fn: Callable[[], object]) -> object:
+        start = time.perf_counter()
+        result = fn()
+        self.samples[name].append(time.perf_counter() - start)
+        return result
+
+    def wait(self, seconds: Tuple[float, float]) -> bool:
+        '''
+            Spends a random time between `seconds` in the browser, returning False when the test is over
+        '''
+        return not self.stop.wait(self.rng.uniform(*seconds) / self.speed)
+
+    def choose(self) -> Dict[str, object]:
+        topics = self.rng.sample(Topic.all(), self.rng.randint(1, len(Topic)))
+        return {
+            **START,
+            'format.value': self.rng.choice(Format.all()),
+            'topics.value': [t for t in Topic if t in topics],
+            'options.value': [o for o in Option if self.rng.random() < 0.7],
+            'order.value': Order.SPACED if self.rng.random() < 0.3 else Order.SHUFFLE,
+            'length.value': self.rng.choice(list(Length)),
+        }
+
+    def run(self) -> None:
+        try:
+            while not self.stop.is_set():
+                self.practice()
+        except Exception as e:
+            self.errors.append(repr(e))
+
+    def practice(self) -> None:
+        '''
+            Visits the page and plays practice sessions until one finishes or the test is over
+        '''
+        client = self.connect()
+        self.timed('GET /', lambda: client.get('/'))
+        self.timed('GET _dash-layout', lambda: client.get('/_dash-layout'))
+        dash = self.timed('GET _dash-dependencies', lambda: DashClient(client))
+        self.timed('validate_topics', lambda: dash.call('topics-wrapper.error', {'topics.value': Topic.all()}))
+
+        selections = self.choose()
+        self.timed('validate_topics', lambda: dash.call('topics-wrapper.error', selections))
+        progress = {}
+
+        def start():
+            values = {**selections, 'practice_progress.data': progress, 'player_store.data': player_store}
+            return self.timed('start_button_click', lambda: dash.call('start_button.children', values))
+
+        player_store = None
+        response = start()
+        while not self.stop.is_set():
+            player_store = response['player_store']['data']
+            url = response['video']['url']
+            if url is None:
+                # the session has finished, and the user closes the finished dialog
+                return
+            self.timed('GET video', lambda: client.get('/' + url))
+
+            if not self.wait(CLIP_SECONDS):
+                return
+            if self.rng.random() < ANSWER_CHANCE:
+                button = 'answer_correct' if self.rng.random() < 0.7 else 'answer_missed'
+                answer = self.timed('record_answer', lambda: dash.call(
+                    'practice_progress.data',
+                    {'player_store.data': player_store, 'practice_progress.data': progress},
+                    changed=f'{button}.n_clicks',
+                ))
+                progress = answer.get('practice_progress', {}).get('data', progress)
+                if not self.wait(ANSWER_SECONDS):
+                    return
+
+            if self.rng.random() < CONTACT_CHANCE and not self.wait(CLIP_SECONDS):
+                return
+
+            if self.rng.random() < RESTART_CHANCE:
+                response = start()
+            else:
+                response = self.timed('play_next_video', lambda: dash.call('video.url', {
+                    'player_ended.data': player_store,
+                    'player_store.data': player_store,
+                    'player_throughput.data': None,
+                }))
+
+
+def simulate(connect: Callable[[], object], users: int, duration: float, speed: float) -> List[LoadResult]:
+    samples: Dict[str, List[float]] = defaultdict(list)
+    stop = threading.Event()
+    threads = [User(connect, samples, stop, speed, seed=i) for i in range(users)]
+
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    errors = [e for thread in threads for e in thread.errors]
+    if errors:
+        print(f'{len(errors)} of {users} users failed, e.g. {errors[0]}')
+
+    results = [
+        LoadResult(**summarize(name, s), clients=users, requests_per_second=len(s) / elapsed)
+        for name, s in samples.items()
+    ]
+    total = [d for s in samples.values() for d in s]
+    results.append(LoadResult(**summarize('all', total), clients=users, requests_per_second=len(total) / elapsed))
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Simulate users practicing at the same time')
+    parser.add_argument('--users', type=int, default=50, help='simultaneous users')
+    parser.add_argument('--duration', type=float, default=60, help='seconds to run for')
+    parser.add_argument('--speed', type=float, default=1, help='how many times faster than real time users watch clips')
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument('--url', help='load test a running server, e.g. http://127.0.0.1:8000')
+    target.add_argument('--gunicorn', choices=CONFIGS, help='start a local gunicorn with this worker class')
+    parser.add_argument('--workers', type=int, default=1, help='gunicorn workers, with --gunicorn')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    if args.gunicorn:
+        target = serve(CONFIGS[args.gunicorn], args.workers)
+    else:
+        target = nullcontext(args.url)
+
+    with target as url:
+        connect = partial(HttpClient, url) if url else server.test_client
+        results = simulate(connect, args.users, args.duration, args.speed)
+
+    title = f"{args.users} users for {args.duration:g}s at {args.speed:g}x speed, {url or 'in-process'}"
+    print_load_results(title, results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
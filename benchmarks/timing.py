@@ -0,0 +1,61 @@
+import statistics
+import time
+from typing import Callable, List, TypedDict
+
+
+class Result(TypedDict):
+    name: str
+    runs: int
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+def summarize(name: str, samples: List[float]) -> Result:
+    '''
+        Summarizes a list of durations in seconds
+    '''
+    samples = sorted(samples)
+
+    def percentile(p: float) -> float:
+        return samples[min(len(samples) - 1, int(p * len(samples)))] * 1000
+
+    return Result(
+        name=name,
+        runs=len(samples),
+        mean_ms=statistics.fmean(samples) * 1000,
+        p50_ms=percentile(0.50),
+        p95_ms=percentile(0.95),
+        p99_ms=percentile(0.99),
+        max_ms=samples[-1] * 1000,
+    )
+
+
+def measure(name: str, fn: Callable[[], object], runs: int, warmup: int = 3) -> Result:
+    '''
+        Times `runs` calls of `fn`, after `warmup` untimed calls
+    '''
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+
+    return summarize(name, samples)
+
+
+def print_results(title: str, results: List[Result]) -> None:
+    width = max(len(r['name']) for r in results)
+    print(f'\n{title}')
+    print(f"{'':{width}}  {'runs':>6} {'mean':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9} {'ops/s':>9}")
+    for r in results:
+        print(
+            f"{r['name']:{width}}  {r['runs']:>6} {r['mean_ms']:>9.3f} {r['p50_ms']:>9.3f} {r['p95_ms']:>9.3f} "
+            f"{r['p99_ms']:>9.3f} {r['max_ms']:>9.3f} {1000 / r['mean_ms']:>9.0f}"
+        )
+
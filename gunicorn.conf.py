@@ -0,0 +1,46 @@
+'''
+    Gunicorn settings for serving the app: `gunicorn -c gunicorn.conf.py src.app:server`
+
+    Each worker runs a pool of threads, so a worker that is busy streaming a clip or waiting on the session database
+    keeps answering callbacks. See the Deployment section of the README for the environment variables.
+'''
+import gc
+import os
+import sys
+
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+
+workers = int(os.getenv('WEB_CONCURRENCY', 1))
+
+threads = int(os.getenv('GUNICORN_THREADS', 16))
+
+# Browsers reuse their connection for the callbacks and clip requests of a session
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+
+graceful_timeout = timeout
+
+# Worker heartbeats go to a memory-backed file system when there is one, rather than a possibly slow disk
+if os.path.isdir('/dev/shm'):
+    worker_tmp_dir = '/dev/shm'
+
+# Build the app and load the clip catalog once in the master process, and fork the workers from it, so that workers
+# boot without importing anything and share the catalog's memory
+preload_app = bool(os.getenv('GUNICORN_PRELOAD'))
+
+
+def on_starting(server):
+    # Practice sessions are kept in worker memory by default, where the other workers cannot see them, so several
+    # workers share them through sqlite instead. The workers inherit the environment of the master process
+    if server.cfg.workers > 1:
+        if os.environ.setdefault('PLAYLIST_SESSION_BACKEND', 'sqlite') == 'memory':
+            server.log.error('%d workers cannot share memory sessions, set PLAYLIST_SESSION_BACKEND=sqlite',
+                             server.cfg.workers)
+            sys.exit(1)
+
+
+def when_ready(server):
+    if preload_app:
+        # the garbage collector writes to every object it tracks, which would copy the shared pages into each worker
+        gc.freeze()
@@ -0,0 +1,234 @@
+import argparse
+import atexit
+import hashlib
+import json
+import logging
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from enum import StrEnum
+from functools import cache
+from pathlib import Path
+from typing import Dict, List, Tuple, TypedDict
+
+from src.models import Clip
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATH = 'analytics.sqlite3'
+
+
+class EventType(StrEnum):
+    SESSION_STARTED = 'session_started'
+    CLIP_PLAYED = 'clip_played'
+    CLIP_SKIPPED = 'clip_skipped'
+    SESSION_FINISHED = 'session_finished'
+
+
+SESSION_EVENTS = {EventType.SESSION_STARTED, EventType.SESSION_FINISHED}
+
+# `(time, type, session, clip, position)`, as stored in the events table
+Event = Tuple[float, EventType, str, str | None, int | None]
+
+
+class EventLog:
+    '''
+        Appends practice events to a sqlite database without making the caller wait.
+
+        `record` puts the event on a bounded queue, and a background thread writes the queue in batches of up to
+        `batch_size` events, one transaction per batch, at least every `flush_interval` seconds. When the writer
+        cannot keep up and the queue is full, events are dropped rather than slowing down the callbacks.
+
+        The writer thread is started on first use in each process, so the log can be created before gunicorn forks.
+
+        Args:
+            path (Path): The database file
+            batch_size (int): The most events written in one transaction
+            flush_interval (float): The longest time in seconds an event waits to be written
+            max_pending (int): The most events waiting to be written
+    '''
+
+    def __init__(self, path: Path, batch_size: int = 500, flush_interval: float = 1.0, max_pending: int = 10000):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.dropped = 0
+        self._lock = threading.Lock()
+        self._pid: int | None = None
+        self._queue: queue.Queue[Event | None] = queue.Queue(max_pending)
+        self._writer: threading.Thread | None = None
+
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute(
+                'CREATE TABLE IF NOT EXISTS events '
+                '(time REAL, type TEXT, session TEXT, clip TEXT, position INTEGER)'
+            )
+
+    def _connect(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.path, timeout=30)
+
+    def _start_writer(self) -> None:
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # after a fork the queue and writer thread of the parent are not usable
+            self._pid = os.getpid()
+            self._queue = queue.Queue(self.max_pending)
+            self._writer = threading.Thread(target=self._write, name='event-log-writer', daemon=True)
+            self._writer.start()
+
+    def record(self, type: EventType, session: str, clip: str | None = None, position: int | None = None) -> None:
+        if self._pid != os.getpid():
+            self._start_writer()
+        try:
+            self._queue.put_nowait((time.time(), type, session, clip, position))
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        '''
+            Writes the pending events and stops the writer thread
+        '''
+        if self._pid != os.getpid() or self._writer is None:
+            return
+        self._queue.put(None)
+        self._writer.join()
+        self._pid = None
+
+    def _write(self) -> None:
+        db = self._connect()
+        closed = False
+        while not closed:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and batch[-1] is not None:
+                try:
+                    batch.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+
+            if batch[-1] is None:
+                batch.pop()
+                closed = True
+            try:
+                with db:
+                    db.executemany('INSERT INTO events VALUES (?, ?, ?, ?, ?)', batch)
+            except sqlite3.Error:
+                logger.exception('Failed to write %d practice events', len(batch))
+        db.close()
+
+
+@cache
+def get_event_log() -> EventLog | None:
+    '''
+        Gets the event log at `ANALYTICS_PATH`, when `ANALYTICS_ENABLED` is set, creating it on first use
+    '''
+    if not os.getenv('ANALYTICS_ENABLED'):
+        return None
+
+    log = EventLog(Path(os.getenv('ANALYTICS_PATH', DEFAULT_PATH)))
+    atexit.register(log.close)
+    return log
+
+
+def session_id(token: str) -> str:
+    '''
+        Identifies a session in the event log without storing its token, which gives access to the session
+    '''
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+def record(type: EventType, token: str, clip: Clip | None = None, position: int | None = None) -> None:
+    '''
+        Records a practice event, when analytics are enabled.
+
+        Session events give the number of clips in the session as the `position`, clip events the clip's position.
+        Clip events for clips that have been removed from the library are left out.
+    '''
+    log = get_event_log()
+    if log is not None and (clip is not None or type in SESSION_EVENTS):
+        log.record(type, session_id(token), clip.key if clip else None, position)
+
+
+class ClipStats(TypedDict):
+    clip: str
+    played: int
+    skipped: int
+    completion_rate: float
+
+
+class Report(TypedDict):
+    sessions_started: int
+    sessions_finished: int
+    completion_rate: float
+    clips: List[ClipStats]
+
+
+def aggregate(path: Path, since: float = 0) -> Report:
+    '''
+        Counts the sessions and the plays and skips of each clip in the event log, for events after `since`.
+
+        A clip is played when it was watched to the end, and skipped when the session was restarted while it was
+        playing.
+    '''
+    with sqlite3.connect(path) as db:
+        sessions: Dict[str, int] = dict(db.execute(
+            'SELECT type, COUNT(*) FROM events WHERE time >= ? AND clip IS NULL GROUP BY type', (since,)
+        ).fetchall())
+        rows = db.execute(
+            '''
+            SELECT clip,
+                SUM(type = ?) AS played,
+                SUM(type = ?) AS skipped
+            FROM events
+            WHERE time >= ? AND clip IS NOT NULL
+            GROUP BY clip
+            ORDER BY played DESC, clip
+            ''',
+            (EventType.CLIP_PLAYED, EventType.CLIP_SKIPPED, since)
+        ).fetchall()
+
+    started = sessions.get(EventType.SESSION_STARTED, 0)
+    finished = sessions.get(EventType.SESSION_FINISHED, 0)
+    return Report(
+        sessions_started=started,
+        sessions_finished=finished,
+        completion_rate=finished / started if started else 0,
+        clips=[
+            ClipStats(clip=clip, played=played, skipped=skipped, completion_rate=played / (played + skipped))
+            for clip, played, skipped in rows
+        ],
+    )
+
+
+def print_report(report: Report) -> None:
+    print(
+        f"Sessions: {report['sessions_started']} started, {report['sessions_finished']} finished "
+        f"({report['completion_rate']:.0%})"
+    )
+    width = max((len(c['clip']) for c in report['clips']), default=4)
+    print(f"\n{'clip':{width}}  {'played':>7} {'skipped':>7} {'completed':>9}")
+    for c in report['clips']:
+        print(f"{c['clip']:{width}}  {c['played']:>7} {c['skipped']:>7} {c['completion_rate']:>9.0%}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Summarize the practice event log')
+    parser.add_argument('--path', default=os.getenv('ANALYTICS_PATH', DEFAULT_PATH), help='the event log database')
+    parser.add_argument('--days', type=float, help='only count events from the last DAYS days')
+    parser.add_argument('--json', action='store_true', help='print the report as json')
+    args = parser.parse_args()
+
+    if not Path(args.path).is_file():
+        sys.exit(f'No event log at {args.path}')
+
+    report = aggregate(Path(args.path), time.time() - args.days * 24 * 60 * 60 if args.days else 0)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
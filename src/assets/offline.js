@@ -0,0 +1,29 @@
+// Registers the service worker that plays clips from packs saved for offline practice, see src/offline.py,
+// and deletes saved packs that are no longer current.
+
+// Packs of tenants other than the default are named like `{rule set}/{language}/{pack}`
+async function savedTenants() {
+    const tenants = new Set();
+    for (const name of await caches.keys()) {
+        const parts = name.startsWith('clips:') ? name.split(':')[1].split('/') : [];
+        if (parts.length > 2) {
+            tenants.add(parts.slice(0, 2).join('/'));
+        }
+    }
+    return [...tenants].join(',');
+}
+
+if ('serviceWorker' in navigator) {
+    window.addEventListener('load', async () => {
+        try {
+            await navigator.serviceWorker.register('sw.js');
+            const registration = await navigator.serviceWorker.ready;
+            const response = await fetch(`offline/caches.json?${new URLSearchParams({tenants: await savedTenants()})}`);
+            if (response.ok) {
+                registration.active.postMessage({type: 'prune', keep: await response.json()});
+            }
+        } catch (error) {
+            console.warn('Offline practice is not available', error);
+        }
+    });
+}
@@ -0,0 +1,150 @@
+// Serves practice clips from the packs saved for offline practice, see src/offline.py
+//
+// Packs are saved in Cache Storage as `clips:{pack}:{version}`, one cache per pack, together with the pack itself.
+// Clip urls contain a content digest, so a saved clip never goes stale; packs are evicted when their version changes.
+
+const CACHE_PREFIX = 'clips:';
+// `/video/{digest}{suffix}`, and `/video/{digest}/{name}` from packs saved before clip urls were digests only
+const CLIP_PATH = /\/video\/[0-9a-f]+(\.\w+|\/[^/]+)$/;
+
+self.addEventListener('install', () => self.skipWaiting());
+
+self.addEventListener('activate', (event) => event.waitUntil(self.clients.claim()));
+
+self.addEventListener('message', (event) => {
+    const data = event.data || {};
+    const reply = (result) => event.ports[0] && event.ports[0].postMessage(result);
+    let work;
+    if (data.type === 'download') {
+        work = downloadPacks(data.packs);
+    } else if (data.type === 'prune') {
+        work = prune(new Set(data.keep));
+    } else {
+        return;
+    }
+    event.waitUntil(work.then(reply, (error) => reply({error: String(error)})));
+});
+
+self.addEventListener('fetch', (event) => {
+    const url = new URL(event.request.url);
+    if (event.request.method !== 'GET' || url.origin !== self.location.origin || !CLIP_PATH.test(url.pathname)) {
+        return;
+    }
+    event.respondWith(serveClip(event.request, url.origin + url.pathname));
+});
+
+function absolute(url) {
+    return new URL(url, self.registration.scope).href;
+}
+
+// Clips are saved without the query, which only tells the server which tenant's catalog to find them in
+function clipKey(url) {
+    const {origin, pathname} = new URL(url, self.registration.scope);
+    return origin + pathname;
+}
+
+function packUrl(cacheName) {
+    return absolute(`offline/pack/${encodeURIComponent(cacheName)}.json`);
+}
+
+async function downloadPacks(packs) {
+    let clips = 0;
+    for (const pack of packs) {
+        const cache = await caches.open(pack.cache);
+        for (const url of pack.urls) {
+            if (!(await cache.match(clipKey(url)))) {
+                const response = await fetch(absolute(url));
+                if (!response.ok) {
+                    throw new Error(`${url} failed with ${response.status}`);
+                }
+                await cache.put(clipKey(url), response);
+            }
+        }
+        // the pack is saved last, so that a pack in the cache always has all of its clips
+        await cache.put(packUrl(pack.cache), new Response(JSON.stringify(pack), {
+            headers: {'Content-Type': 'application/json'},
+        }));
+        clips += pack.urls.length;
+
+        const versionPrefix = `${CACHE_PREFIX}${pack.name}:`;
+        for (const name of await caches.keys()) {
+            if (name.startsWith(versionPrefix) && name !== pack.cache) {
+                await caches.delete(name);
+            }
+        }
+    }
+    return {clips};
+}
+
+async function prune(keep) {
+    let deleted = 0;
+    for (const name of await caches.keys()) {
+        if (name.startsWith(CACHE_PREFIX) && !keep.has(name)) {
+            await caches.delete(name);
+            deleted += 1;
+        }
+    }
+    return {deleted};
+}
+
+async function findAlternate(url) {
+    for (const name of await caches.keys()) {
+        if (!name.startsWith(CACHE_PREFIX)) {
+            continue;
+        }
+        const cache = await caches.open(name);
+        const pack = await cache.match(packUrl(name));
+        if (!pack) {
+            continue;
+        }
+        const {alternates} = await pack.json();
+        for (const [other, saved] of Object.entries(alternates)) {
+            if (clipKey(other) === url) {
+                return cache.match(clipKey(saved));
+            }
+        }
+    }
+    return undefined;
+}
+
+async function serveClip(request, url) {
+    let response = await caches.match(url);
+    if (!response) {
+        try {
+            return await fetch(request);
+        } catch (error) {
+            // offline, and this rendition was not saved: play another saved rendition of the clip
+            response = await findAlternate(url);
+            if (!response) {
+                throw error;
+            }
+        }
+    }
+    return withRange(request, response);
+}
+
+// Video elements ask for byte ranges, and some browsers only play 206 partial content
+async function withRange(request, response) {
+    const match = /^bytes=(\d*)-(\d*)$/.exec(request.headers.get('Range') || '');
+    if (!match || (!match[1] && !match[2])) {
+        return response;
+    }
+
+    const blob = await response.blob();
+    const size = blob.size;
+    const start = match[1] ? Number(match[1]) : Math.max(0, size - Number(match[2]));
+    const end = match[1] && match[2] ? Math.min(Number(match[2]), size - 1) : size - 1;
+    if (start >= size || start > end) {
+        return new Response(null, {status: 416, headers: {'Content-Range': `bytes */${size}`}});
+    }
+
+    return new Response(blob.slice(start, end + 1), {
+        status: 206,
+        headers: {
+            'Accept-Ranges': 'bytes',
+            'Content-Type': response.headers.get('Content-Type') || 'video/mp4',
+            'Content-Range': `bytes ${start}-${end}/${size}`,
+            'Content-Length': String(end - start + 1),
+        },
+    });
+}
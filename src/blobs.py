@@ -0,0 +1,121 @@
+'''
+    Stores every clip file once by its content digest, as `src/blobs/{digest[:2]}/{digest}{suffix}`.
+
+    Usage: `python -m src.blobs [--link]`
+
+    The manifests map the logical path of each clip, like `static/receptive/penalties/cut.mp4`, to the digest of its
+    content, and `src.video` serves `/video/{digest}{suffix}` from the blob once it has been stored. Files with the same
+    content share one blob, whatever their paths. Blobs are hard links to the library files where the filesystem allows,
+    so storing them takes no extra space. `--link` also replaces the library files that have the same content as
+    another by hard links to their blob, so that each copy is only stored once; replace those files rather than
+    overwriting them in place, which would change every copy. Blobs that are no longer in the manifest are deleted.
+
+    A library file that is overwritten in place also changes its hard-linked blob, so a blob is only served while its
+    size and mtime match the manifest, and the library file is served otherwise.
+'''
+import argparse
+import os
+import shutil
+from collections import defaultdict
+from pathlib import Path, PurePosixPath
+from typing import Dict, List, Set, Tuple
+
+from src import manifest
+from src.manifest import SRC_DIR, FileEntry, matches
+
+BLOB_DIR = Path(os.getenv('CLIP_BLOBS', SRC_DIR / 'blobs'))
+
+
+def blob_path(digest: str, suffix: str) -> Path:
+    return BLOB_DIR / digest[:2] / f'{digest}{suffix}'
+
+
+def get_blob(entry: FileEntry) -> Path | None:
+    '''
+        Gets the blob to serve for a file, or None when it has not been stored or has changed since
+    '''
+    path = blob_path(entry['digest'], PurePosixPath(entry['path']).suffix)
+    return path if matches(path, entry) else None
+
+
+def store(entries: List[FileEntry]) -> bool:
+    '''
+        Stores a blob for files with the same content, returning False when it is already stored
+    '''
+    first = entries[0]
+    target = blob_path(first['digest'], PurePosixPath(first['path']).suffix)
+    if any(matches(target, entry) for entry in entries):
+        return False
+
+    source = SRC_DIR / first['path']
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = target.with_name(f'.{target.name}.{os.getpid()}.tmp')
+    try:
+        os.link(source, tmp)
+    except OSError:
+        # keep the mtime, see `matches`
+        shutil.copy2(source, tmp)
+    os.replace(tmp, target)
+    return True
+
+
+def link(entry: FileEntry) -> bool:
+    '''
+        Replaces a library file by a hard link to its blob, returning False when it already is one, has changed since
+        the manifest was written, or the blob is on another filesystem
+    '''
+    source = SRC_DIR / entry['path']
+    target = blob_path(entry['digest'], source.suffix)
+    if not matches(source, entry) or not target.is_file() or source.samefile(target):
+        return False
+
+    tmp = source.with_name(f'.{source.name}.{os.getpid()}.tmp')
+    try:
+        os.link(target, tmp)
+    except OSError:
+        return False
+    os.replace(tmp, source)
+    return True
+
+
+def prune(digests: Set[str]) -> int:
+    '''
+        Deletes the blobs whose digest is not in `digests`, returning the number deleted
+    '''
+    deleted = 0
+    for path in BLOB_DIR.glob('*/*'):
+        if not path.name.startswith('.') and path.name.split('.')[0] not in digests:
+            path.unlink(missing_ok=True)
+            deleted += 1
+    return deleted
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Store clip files by their content digest')
+    parser.add_argument('--link', action='store_true', help='replace duplicate library files by links to their blob')
+    args = parser.parse_args()
+
+    # every tenant's library shares the blobs, so that rule sets and languages with the same clips store them once
+    libraries = {tenant: manifest.load_tenant(tenant) for tenant in manifest.list_tenants()}
+    blobs: Dict[Tuple[str, str], List[FileEntry]] = defaultdict(list)
+    for current in libraries.values():
+        for entry in current['clips']:
+            for f in manifest.entry_files(entry):
+                blobs[(f['digest'], PurePosixPath(f['path']).suffix)].append(f)
+
+    stored = sum(store(files) for files in blobs.values())
+    linked = sum(link(f) for files in blobs.values() for f in files) if args.link else 0
+    deleted = prune({digest for digest, _ in blobs})
+
+    # linked files have the blob's mtime, so rescan to keep the manifests in step
+    if linked:
+        for tenant, current in libraries.items():
+            manifest.write(manifest.scan(current, manifest.tenant_dir(tenant)), manifest.tenant_manifest_path(tenant))
+
+    files = sum(len(files) for files in blobs.values())
+    print(f'Stored {stored} new blobs, {len(blobs)} blobs for {files} files')
+    print(f'Linked {linked} duplicate files to their blob, deleted {deleted} unused blobs')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,8 +1,23 @@
+import copy
+import os
 import random
-from pathlib import Path
-from typing import List
+import secrets
+import threading
+import time
+from collections import defaultdict
+from functools import lru_cache
+from pathlib import PurePosixPath
+from typing import Dict, Iterable, List, Sequence, Tuple
 
-from src.models import Clip, Format, Option, Topic
+from src import manifest
+from src.manifest import FileEntry, ManifestEntry
+from src.models import Clip, Format, Option, PlaylistSession, Quality, Segment, Tenant, Topic
+from src.scheduler import Progress, clip_key, schedule
+
+DEFAULT_TENANT = Tenant.get_default_option()
+
+# Assumed length in seconds of clips whose duration could not be read, when filling a timed session
+UNKNOWN_CLIP_DURATION = 6.0
 
 
 def get_clips() -> List[Clip]:
@@ -12,69 +27,431 @@ def get_clips() -> List[Clip]:
         Clips are expected to be organized like `static/{Format}/{Topic}/{*.mp4}`
 
         If the subfolder names are not valid `Format`s or `Topic`s, the video is not included in the return value.
+
+        The clip list is read from the manifest when it is up to date, see `src.manifest`.
     '''
-    all_files = [f.relative_to('src') for f in Path("src/static/").rglob('*') if f.is_file()]
+    return [to_clip(e) for e in manifest.load()['clips']]
 
-    clips = []
 
-    for f in all_files:
-        try:
-            if "intro" in f.name:
-                format = Format(f.parent.name)
-                topic = None
-            elif "outro" in f.name:
-                format = None
-                topic = None
-            else:
-                topic = Topic(f.parent.name)
-                format = Format(f.parent.parent.name)
+def file_url(entry: FileEntry, tenant: Tenant | None = None) -> str:
+    '''
+        Gets the url of a file from its content digest, served by `src.video`.
+
+        Files with the same content get the same url whatever their paths, so browsers, CDNs and saved packs only
+        store them once. Files of tenants other than the default name their tenant, so that a worker that has not
+        loaded its catalog yet knows where to find them.
+    '''
+    url = f"video/{entry['digest']}{PurePosixPath(entry['path']).suffix}"
+    return url if tenant is None or tenant == DEFAULT_TENANT else f'{url}?tenant={tenant}'
+
+
+def to_clip(entry: ManifestEntry, tenant: Tenant | None = None) -> Clip:
+    '''
+        Converts a manifest entry to a clip
+    '''
+    name = PurePosixPath(entry['path']).name
+    return Clip(
+        id=entry['id'],
+        key=clip_key(entry['format'], entry['topic'], name, tenant),
+        format=entry['format'],
+        topic=entry['topic'],
+        name=name,
+        url=file_url(entry, tenant),
+        duration=entry['duration'],
+        renditions={quality: file_url(r, tenant) for quality, r in entry['renditions'].items()},
+        poster=file_url(entry['poster'], tenant) if entry['poster'] else None,
+        segments=tuple(Segment(url=file_url(s, tenant), duration=s['duration']) for s in entry['segments']),
+    )
 
-            clips.append(Clip(format=format, topic=topic, name=f.name, url=str(f)))
-        except ValueError:
-            pass
 
-    return clips
+def get_clip_url(clip: Clip, quality: Quality, throughput: float | None = None) -> str:
+    '''
+        Gets the url of the clip rendition for the selected quality.
+
+        `Quality.AUTO` picks a rendition from the measured `throughput` in Mbps.
+        The original file is used when the clip has not been transcoded to that quality.
+    '''
+    if quality == Quality.AUTO:
+        quality = Quality.for_throughput(throughput)
+    return clip.renditions.get(quality, clip.url)
 
 
-clips = get_clips()
+def clip_duration(clip: Clip) -> float:
+    return clip.duration or UNKNOWN_CLIP_DURATION
 
 
-def get_sub_playlist(format: Format, topics: List[Topic], include_intro: bool) -> List[Clip]:
+def fill_duration(clips: List[Clip], budget: float, rng: random.Random) -> List[Clip]:
     '''
-        Gets all clips for the given format and topics, and shuffles their order.
-        When `include_intro=True`, the intro clip for that format is included at the beginning
+        Picks clips in order while they fit in the `budget` in seconds, skipping clips that are too long.
+        When every clip fits and there is time left, the clips are shuffled and played again.
+        At least one clip is picked, even when it does not fit.
+    '''
+    playlist = []
+    remaining = budget
+    pool = clips
+    while pool:
+        skipped = False
+        for clip in pool:
+            if clip_duration(clip) <= remaining:
+                playlist.append(clip)
+                remaining -= clip_duration(clip)
+            else:
+                skipped = True
+        if skipped:
+            break
+        pool = rng.sample(pool, len(pool))
+
+    return playlist or clips[:1]
+
+
+class ClipCatalog:
+    '''
+        Indexes clips by format and topic so that building a playlist only touches the selected clips
+
+        A catalog is not changed once built, see `updated`, so the threads of a worker share it without locking.
+        Each playlist shuffles with its own `random.Random`, rather than the module-level generator.
+
+        Args:
+            entries (List[ManifestEntry]): The clip files to index, as listed in the manifest
+            tenant (Tenant | None): The tenant whose clip library this is, the default tenant when None
     '''
-    relevant_clips = [c for c in clips if c['format'] == format and c['topic'] in topics]
 
-    random.shuffle(relevant_clips)
+    def __init__(self, entries: List[ManifestEntry], tenant: Tenant | None = None):
+        self.tenant = tenant or DEFAULT_TENANT
+        self._entries: Dict[str, ManifestEntry] = {}
+        self._clips: Dict[str, Clip] = {}
+        self._by_id: Dict[int, Clip] = {}
+        self._by_format_topic: Dict[Tuple[Format, Topic], List[Clip]] = defaultdict(list)
+        self._intros: Dict[Format, Clip] = {}
+        self._outro: Clip | None = None
+        # the files with each content digest, by path
+        self._files: Dict[str, Dict[str, FileEntry]] = {}
+
+        known_ids = [e['id'] for e in entries if e['id'] is not None]
+        self._next_id = manifest.assign_ids(entries, max(known_ids, default=-1) + 1)
+        for entry in entries:
+            self._add(entry)
+
+    def _add(self, entry: ManifestEntry) -> None:
+        clip = to_clip(entry, self.tenant)
+        self._entries[entry['path']] = entry
+        self._clips[entry['path']] = clip
+        self._by_id[clip.id] = clip
+        for f in manifest.entry_files(entry):
+            # the inner dicts are shared with the catalogs this one was copied from, see `updated`, so are replaced
+            self._files[f['digest']] = {**self._files.get(f['digest'], {}), f['path']: f}
+
+        if clip.format is None:
+            self._outro = clip
+        elif clip.topic is None:
+            self._intros[clip.format] = clip
+        else:
+            self._by_format_topic[(clip.format, clip.topic)].append(clip)
+
+    def _remove(self, path: str) -> None:
+        entry = self._entries.pop(path)
+        clip = self._clips.pop(path)
+        del self._by_id[clip.id]
+        for f in manifest.entry_files(entry):
+            others = {p: other for p, other in self._files.get(f['digest'], {}).items() if p != f['path']}
+            if others:
+                self._files[f['digest']] = others
+            else:
+                self._files.pop(f['digest'], None)
+
+        if clip.format is None:
+            self._outro = None
+        elif clip.topic is None:
+            self._intros.pop(clip.format, None)
+        else:
+            key = (clip.format, clip.topic)
+            self._by_format_topic[key] = [c for c in self._by_format_topic[key] if c is not clip]
+
+    def updated(self, removed: Iterable[str], upserted: Iterable[ManifestEntry]) -> 'ClipCatalog':
+        '''
+            Returns a new catalog with the clips at the `removed` paths taken out and the `upserted` entries added or
+            replaced. This catalog is left unchanged, so requests that are using it are not affected.
+            New clips are given ids after the highest id this catalog has handed out.
+
+            Only the indexes are copied, and only the index lists of the changed format/topic are rebuilt.
+        '''
+        catalog = copy.copy(self)
+        catalog._entries = dict(self._entries)
+        catalog._clips = dict(self._clips)
+        catalog._by_id = dict(self._by_id)
+        catalog._by_format_topic = defaultdict(list, self._by_format_topic)
+        catalog._intros = dict(self._intros)
+        catalog._files = dict(self._files)
+
+        upserted = list(upserted)
+        catalog._next_id = manifest.assign_ids(upserted, self._next_id)
+        for path in {*removed, *(e['path'] for e in upserted)}:
+            if path in catalog._entries:
+                catalog._remove(path)
+        for entry in upserted:
+            # `_add` appends in place, so give the changed format/topic its own list first
+            key = (entry['format'], entry['topic'])
+            if key in catalog._by_format_topic and catalog._by_format_topic[key] is self._by_format_topic.get(key):
+                catalog._by_format_topic[key] = list(catalog._by_format_topic[key])
+            catalog._add(entry)
+
+        return catalog
+
+    def entries(self) -> List[ManifestEntry]:
+        return list(self._entries.values())
+
+    def get_clip(self, id: int) -> Clip | None:
+        '''
+            Gets a clip by its id, or None when it has been removed from the library
+        '''
+        return self._by_id.get(id)
+
+    def get_clips(self, ids: Iterable[int]) -> List[Clip]:
+        '''
+            Gets the clips of a session playlist, leaving out clips that have been removed from the library
+        '''
+        return [clip for clip in map(self._by_id.get, ids) if clip]
+
+    def find_clip(self, ids: Sequence[int], cursor: int) -> Tuple[int, Clip | None]:
+        '''
+            Gets the first clip of a session playlist at or after `cursor` that is still in the library, and its
+            position. Returns `(len(ids), None)` when there is none.
+        '''
+        for i in range(cursor, len(ids)):
+            clip = self._by_id.get(ids[i])
+            if clip:
+                return i, clip
+        return len(ids), None
+
+    def get_packs(self) -> Dict[str, List[Clip]]:
+        '''
+            Groups the clips for saving offline: a pack per format and topic, one for each format's intro, and one for
+            the outro
+        '''
+        packs = {f'{format}/{topic}': list(clips) for (format, topic), clips in self._by_format_topic.items() if clips}
+        packs.update({f'{format}/intro': [intro] for format, intro in self._intros.items()})
+        if self._outro:
+            packs['outro'] = [self._outro]
+        return packs
+
+    def get_file(self, digest: str) -> FileEntry | None:
+        '''
+            Gets the manifest entry of a clip, rendition, poster or segment file with the given content digest.
+            When several files have the same content, any of them is returned.
+        '''
+        files = self._files.get(digest)
+        return next(iter(files.values())) if files else None
+
+    def get_sub_playlist(
+        self,
+        format: Format,
+        topics: List[Topic],
+        include_intro: bool,
+        progress: Progress | None = None,
+        rng: random.Random | None = None,
+        budget: float | None = None
+    ) -> List[Clip]:
+        '''
+            Gets all clips for the given format and topics, and shuffles their order with `rng`.
+            When `progress` is given, the clips are ordered for spaced repetition instead, see `src.scheduler`.
+            When `budget` is given, clips are picked to fill that many seconds instead, see `fill_duration`.
+            When `include_intro=True`, the intro clip for that format is included at the beginning
+        '''
+        rng = rng or random.Random()
+
+        relevant_clips = []
+        for topic in topics:
+            relevant_clips.extend(self._by_format_topic.get((format, topic), ()))
+
+        if progress is None:
+            rng.shuffle(relevant_clips)
+        else:
+            relevant_clips = schedule(relevant_clips, progress, rng=rng)
+
+        intro = self._intros.get(format) if include_intro else None
+
+        if budget is not None and relevant_clips:
+            if intro:
+                budget -= clip_duration(intro)
+            relevant_clips = fill_duration(relevant_clips, budget, rng)
 
-    if include_intro:
-        intro = next((c for c in clips if Option.INTRO in c['name'] and format == c['format']), None)
         if intro:
             relevant_clips.insert(0, intro)
 
-    return relevant_clips
+        return relevant_clips
 
+    def get_playlist(
+        self,
+        format: Format,
+        topics: List[Topic],
+        options: List[Option],
+        progress: Progress | None = None,
+        seed: int | None = None,
+        length: int | None = None
+    ) -> List[Clip]:
+        '''
+            Gets clips for the given formats and topics.
+            Content for each format is grouped together.
+            The outro clip is included at the end, when selected.
+            The same `seed` and selections always give the same order.
 
-def get_playlist(format: Format, topics: List[Topic], options: List[Option]) -> List[Clip]:
-    '''
-        Gets clips for the given formats and topics.
-        Content for each format is grouped together.
-        The outro clip is included at the end, when selected.
-    '''
-    playlist = []
+            A timed session picks clips to fill `length` seconds, split evenly between the formats.
+        '''
+        rng = random.Random(seed)
+        playlist = []
 
-    if format == Format.BOTH:
-        selected_formats = [Format.RECEPTIVE, Format.EXPRESSIVE]
-    else:
-        selected_formats = [format]
+        if format == Format.BOTH:
+            selected_formats = [Format.RECEPTIVE, Format.EXPRESSIVE]
+        else:
+            selected_formats = [format]
 
-    for f in selected_formats:
-        playlist.extend(get_sub_playlist(f, topics, Option.INTRO in options))
+        outro = self._outro if Option.OUTRO in options else None
+
+        budget = None
+        if length is not None:
+            budget = (length - (clip_duration(outro) if outro else 0)) / len(selected_formats)
+
+        for f in selected_formats:
+            playlist.extend(self.get_sub_playlist(f, topics, Option.INTRO in options, progress, rng, budget))
 
-    if Option.OUTRO in options:
-        outro = next((c for c in clips if Option.OUTRO in c['name']), None)
         if outro:
             playlist.append(outro)
 
-    return playlist
+        return playlist
+
+
+# Seconds a tenant's catalog is kept after its last use, see `get_catalog`
+TENANT_IDLE_SECONDS = float(os.getenv('TENANT_IDLE_SECONDS', 600))
+
+_catalogs: Dict[Tenant, ClipCatalog] = {}
+_last_used: Dict[Tenant, float] = {}
+_catalog_lock = threading.Lock()
+
+
+def get_catalog(tenant: Tenant | None = None) -> ClipCatalog:
+    '''
+        Gets the catalog of a tenant, the default tenant when None, loading it from its manifest on first use.
+
+        Catalogs of other tenants are evicted once they have not been used for `TENANT_IDLE_SECONDS`, so a worker only
+        holds the catalogs its users are practicing with. Raises ValueError for a tenant without a clip library.
+    '''
+    tenant = tenant or DEFAULT_TENANT
+    catalog = _catalogs.get(tenant)
+    if catalog is None:
+        with _catalog_lock:
+            catalog = _catalogs.get(tenant)
+            if catalog is None:
+                if tenant not in manifest.list_tenants():
+                    raise ValueError(f'No clip library for {tenant}')
+                catalog = ClipCatalog(manifest.load_tenant(tenant)['clips'], tenant)
+                _catalogs[tenant] = catalog
+
+    now = time.monotonic()
+    if tenant != DEFAULT_TENANT:
+        _last_used[tenant] = now
+    if _last_used:
+        evict_idle(now - TENANT_IDLE_SECONDS)
+    return catalog
+
+
+def evict_idle(before: float) -> None:
+    '''
+        Drops the catalogs of tenants that have not been used since `before`. Requests already holding one finish
+        with it.
+    '''
+    idle = [tenant for tenant, last_used in list(_last_used.items()) if last_used < before]
+    if not idle:
+        return
+
+    with _catalog_lock:
+        for tenant in idle:
+            if _last_used.get(tenant, before) < before:
+                _catalogs.pop(tenant, None)
+                _last_used.pop(tenant, None)
+    # cached playlists hold on to the evicted catalogs, free them
+    get_seeded_playlist.cache_clear()
+
+
+def get_session_catalog(session: PlaylistSession) -> ClipCatalog | None:
+    '''
+        Gets the catalog that the clip ids of a session refer to, or None when the clip library of its tenant has been
+        removed since the session started, which ends the session like an expired one
+    '''
+    try:
+        return get_catalog(Tenant.parse(session['tenant']) if session.get('tenant') else None)
+    except ValueError:
+        return None
+
+
+def set_catalog(catalog: ClipCatalog) -> None:
+    '''
+        Swaps in a new catalog for the default tenant. Requests already holding the old catalog finish with it.
+    '''
+    _catalogs[DEFAULT_TENANT] = catalog
+    # cached playlists of the old catalog can no longer be hit, free them
+    get_seeded_playlist.cache_clear()
+
+
+def get_sub_playlist(
+    format: Format,
+    topics: List[Topic],
+    include_intro: bool,
+    progress: Progress | None = None
+) -> List[Clip]:
+    '''
+        Gets all clips for the given format and topics from the catalog, and shuffles or schedules their order.
+    '''
+    return get_catalog().get_sub_playlist(format, topics, include_intro, progress)
+
+
+@lru_cache(maxsize=int(os.getenv('PLAYLIST_CACHE_SIZE', 1024)))
+def get_seeded_playlist(
+    catalog: ClipCatalog,
+    seed: int,
+    format: Format,
+    topics: Tuple[Topic, ...],
+    options: Tuple[Option, ...],
+    length: int | None = None
+) -> Tuple[Clip, ...]:
+    '''
+        Gets the shuffled playlist for a seed and selections, memoized in a bounded LRU cache.
+
+        The catalog is part of the key, so a request that is still building a playlist from the old catalog while
+        another thread swaps in a new one cannot cache stale clips.
+    '''
+    return tuple(catalog.get_playlist(format, list(topics), list(options), seed=seed, length=length))
+
+
+def new_seed() -> int:
+    return secrets.randbelow(2 ** 31)
+
+
+def get_playlist(
+    format: Format,
+    topics: List[Topic],
+    options: List[Option],
+    progress: Progress | None = None,
+    seed: int | None = None,
+    length: int | None = None,
+    tenant: Tenant | None = None
+) -> List[Clip]:
+    '''
+        Gets clips for the given formats and topics from the tenant's catalog, filling `length` seconds for a timed
+        session.
+
+        Shuffled playlists with a `seed` are reproducible and served from a cache. Spaced repetition playlists
+        depend on the learner's `progress`, so they are never cached.
+    '''
+    catalog = get_catalog(tenant)
+    if seed is None or progress is not None:
+        return catalog.get_playlist(format, topics, options, progress, seed, length)
+
+    # normalize the selections, so that the order of checkbox clicks does not change the playlist
+    return list(get_seeded_playlist(
+        catalog,
+        seed,
+        Format(format),
+        tuple(t for t in Topic if t in topics),
+        tuple(o for o in Option if o in options),
+        length,
+    ))
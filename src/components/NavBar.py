@@ -1,12 +1,46 @@
+import json
 from typing import Dict, List, Union
+from urllib.parse import urlencode
 
 import dash_mantine_components as dmc
-from dash import Input, Output, State, callback, no_update
+from dash import Input, Output, State, callback, clientside_callback, dcc, no_update
+from dash.exceptions import PreventUpdate
 from dash_iconify import DashIconify
 
-from src.clips import get_playlist
+from src import analytics
+from src.analytics import EventType, get_event_log
+from src.clips import get_catalog, get_clip_url, get_playlist, get_session_catalog, new_seed
+from src.hls import chapter_starts
 from src.components import Player
-from src.models import AppStore, Format, Option, Topic
+from src.manifest import list_tenants
+from src.models import AppStore, Format, Length, Option, Order, PlayerStore, PlaylistSession, Quality, Tenant, Topic
+from src.scheduler import Progress, pop_queued, queue_playlist
+from src.sessions import get_store
+
+
+class TenantPicker(dmc.AccordionItem):
+    '''
+        Renders the rule set and language picker, with the tenants that have a clip library
+
+        Args:
+            tenants (List[Tenant]): The tenants to pick from
+    '''
+
+    def __init__(self, tenants: List[Tenant]):
+        super().__init__(
+            children=[
+                dmc.AccordionControl('Rules & Language'),
+                dmc.AccordionPanel(
+                    dmc.Select(
+                        id='tenant',
+                        data=[{'label': tenant.label(), 'value': str(tenant)} for tenant in tenants],
+                        value=str(Tenant.get_default_option()),
+                        allowDeselect=False,
+                    )
+                ),
+            ],
+            value='tenant',
+        )
 
 
 class FormatPicker(dmc.AccordionItem):
@@ -80,7 +114,7 @@ class OptionPicker(dmc.AccordionItem):
         super().__init__(
             children=[
                 dmc.AccordionControl('Other Options'),
-                dmc.AccordionPanel(
+                dmc.AccordionPanel([
                     dmc.CheckboxGroup(
                         id='options',
                         children=dmc.Stack([
@@ -89,12 +123,119 @@ class OptionPicker(dmc.AccordionItem):
                         ]),
                         value=Option.all(),
                     ),
-                )
+                    dmc.SegmentedControl(
+                        id='order',
+                        data=Order.get_options(),
+                        value=Order.get_default_option(),
+                        fullWidth=True,
+                        mt='md',
+                    ),
+                    dmc.Switch(
+                        id='continuous',
+                        label='Continuous Mode',
+                        description='Stream the whole session as one video',
+                        checked=False,
+                        size='sm',
+                        mt='md',
+                    ),
+                ])
             ],
             value='options'
         )
 
 
+class LengthPicker(dmc.AccordionItem):
+    def __init__(self):
+
+        super().__init__(
+            children=[
+                dmc.AccordionControl('Session Length'),
+                dmc.AccordionPanel(
+                    dmc.SegmentedControl(
+                        id='length',
+                        data=Length.get_options(),
+                        value=Length.get_default_option()
+                    )
+                ),
+            ],
+            value='length',
+        )
+
+
+class QualityPicker(dmc.AccordionItem):
+    def __init__(self):
+
+        super().__init__(
+            children=[
+                dmc.AccordionControl('Video Quality'),
+                dmc.AccordionPanel(
+                    dmc.SegmentedControl(
+                        id='quality',
+                        data=Quality.get_options(),
+                        value=Quality.get_default_option()
+                    )
+                ),
+            ],
+            value='quality',
+        )
+
+
+class OfflinePicker(dmc.AccordionItem):
+    '''
+        Saves the clips of the selected format, topics and options in the browser, so they play without being downloaded again
+    '''
+
+    def __init__(self):
+        super().__init__(
+            children=[
+                dmc.AccordionControl('Offline Practice'),
+                dmc.AccordionPanel([
+                    dmc.Text(
+                        'Save the selected clips on this device, so they play without waiting on a poor connection.',
+                        size='sm',
+                    ),
+                    dmc.Button('Save Clips', id='offline_button', variant='light', fullWidth=True, mt='sm'),
+                    dmc.Text(id='offline_status', size='sm', c='dimmed', mt='xs'),
+                ])
+            ],
+            value='offline',
+        )
+
+        # the service worker in `src/assets/sw.js` downloads the packs, and replies when they are saved
+        clientside_callback(
+            '''
+            async (n, tenant, format, topics, options, quality) => {
+                if (!('serviceWorker' in navigator)) {
+                    return 'This browser cannot save clips';
+                }
+                const params = new URLSearchParams({
+                    tenant, format, topics: topics.join(','), options: options.join(','), quality,
+                });
+                const response = await fetch(`offline/packs.json?${params}`);
+                if (!response.ok) {
+                    return 'The clips could not be saved, try again later';
+                }
+                const packs = await response.json();
+                const registration = await navigator.serviceWorker.ready;
+                const result = await new Promise((resolve) => {
+                    const channel = new MessageChannel();
+                    channel.port1.onmessage = (event) => resolve(event.data);
+                    registration.active.postMessage({type: 'download', packs}, [channel.port2]);
+                });
+                return result.error ? `The clips could not be saved: ${result.error}` : `${result.clips} clips saved`;
+            }
+            ''',
+            Output('offline_status', 'children'),
+            Input('offline_button', 'n_clicks'),
+            State('tenant', 'value'),
+            State('format', 'value'),
+            State('topics', 'value'),
+            State('options', 'value'),
+            State('quality', 'value'),
+            prevent_initial_call=True,
+        )
+
+
 class NavBar(dmc.AppShellNavbar):
     '''
         Renders the Options control component
@@ -103,20 +244,29 @@ class NavBar(dmc.AppShellNavbar):
             player (Player): The player component
             contact_form (str): The identifier of the contact form component
             app_store (str): The identifier of the app store
+            location (str): The identifier of the location component, which holds the shareable session url
     '''
 
-    def __init__(self, player: Player, contact_form: str, app_store: str):
+    def __init__(self, player: Player, contact_form: str, app_store: str, location: str):
         self.contact_button_id = 'contact_button'
         self.start_button_id = 'start_button'
+        self.seed_store_id = 'seed'
+        tenants = list_tenants()
 
         super().__init__(
             id='navbar',
             children=[
+                dcc.Store(id=self.seed_store_id, data=None),
+
                 dmc.Accordion(
                     children=[
+                        TenantPicker(tenants),
                         FormatPicker(),
                         TopicPicker(self.start_button_id),
                         OptionPicker(),
+                        LengthPicker(),
+                        QualityPicker(),
+                        OfflinePicker(),
                     ],
                     multiple=True,
                     variant='contained'
@@ -144,76 +294,214 @@ class NavBar(dmc.AppShellNavbar):
                 player_store=Output(player.store, 'data', allow_duplicate=True,),
                 start_button_text=Output(self.start_button_id, 'children', allow_duplicate=True,),
                 url=Output(player.video, 'url', allow_duplicate=True, ),
+                prefetch=Output(player.prefetch, 'children', allow_duplicate=True),
                 mobile_burger=Output('mobile-burger', 'opened', allow_duplicate=True),
                 desktop_burger=Output('desktop-burger', 'opened', allow_duplicate=True),
-                app_store=Output(app_store, 'data', allow_duplicate=True)
+                app_store=Output(app_store, 'data', allow_duplicate=True),
+                search=Output(location, 'search'),
+                seed=Output(self.seed_store_id, 'data'),
+                error=Output('topics-wrapper', 'error', allow_duplicate=True),
             ),
             inputs=dict(
                 btn=Input(self.start_button_id, 'n_clicks')
             ),
             state=dict(
+                tenant=State('tenant', 'value'),
                 format=State('format', 'value'),
                 topics=State('topics', 'value'),
                 options=State('options', 'value'),
+                order=State('order', 'value'),
+                length=State('length', 'value'),
+                progress=State(player.progress, 'data'),
+                quality=State('quality', 'value'),
+                continuous=State('continuous', 'checked'),
+                throughput=State(player.throughput, 'data'),
+                old_player_store=State(player.store, 'data'),
+                seed=State(self.seed_store_id, 'data'),
             ),
             prevent_initial_call=True
         )
-        def start_button_click(format: Format, topics: List[Topic], options: List[Option], **kwargs) -> Dict[str, Union[bool, str, Dict]]:
+        def start_button_click(
+            tenant: str,
+            format: Format,
+            topics: List[Topic],
+            options: List[Option],
+            order: Order,
+            length: Length,
+            progress: Progress | None,
+            quality: Quality,
+            continuous: bool,
+            throughput: float | None,
+            old_player_store: PlayerStore | None,
+            seed: int | None,
+            **kwargs
+        ) -> Dict[str, Union[bool, str, Dict]]:
             '''
-                When the start button is clicked, get the playlist based on the selected options, and
-                set the store contents and url of the first video
+                When the start button is clicked, get the playlist based on the selected options, store its clip ids in
+                a new server-side session, and set the session token and url of the first video in the selected quality.
+                Clips come from the catalog of the selected rule set and language, which the session remembers.
+                The playlist is shuffled, or ordered for spaced repetition from the progress saved in the browser. A
+                spaced repetition session is queued, so that each next clip is picked after the last one is answered.
+                A timed session picks clips to fill the selected length.
+
+                A shuffled playlist is seeded, with the seed and selections written to the url so the session can be
+                shared and replayed. The seed from a shared url is used once, so Restart shuffles again.
+                The following videos are prefetched while the first one plays.
+
+                In continuous mode the whole session is streamed as one HLS video instead, when every clip has been
+                segmented, and the start time of each clip is sent with the session so the browser knows which clip is
+                playing.
+
+                Nothing changes when the selected tenant has no clip library, which happens when it has been removed
+                since the page was loaded, and an error is shown under the topics when no clips match the selection.
             '''
-            first_video, *remaining_playlist = get_playlist(format, topics, options)
+            try:
+                selected = Tenant.parse(tenant)
+                get_catalog(selected)
+            except ValueError:
+                raise PreventUpdate
+
+            sessions = get_store()
+            old_token = old_player_store.get('session') if old_player_store else None
+            if old_token:
+                old_session: PlaylistSession | None = sessions.get(old_token) if get_event_log() else None
+                old_catalog = get_session_catalog(old_session) if old_session else None
+                if old_catalog:
+                    # restarting skips the clip that was playing
+                    cursor = old_player_store['cursor']
+                    clip = old_catalog.get_clip(old_session['playlist'][cursor])
+                    analytics.record(EventType.CLIP_SKIPPED, old_token, clip, cursor)
+                sessions.delete(old_token)
+
+            seconds = Length(length).seconds()
+            if order == Order.SPACED:
+                playlist = get_playlist(format, topics, options, progress or {}, length=seconds, tenant=selected)
+                search = ''
+            else:
+                seed = new_seed() if seed is None else seed
+                playlist = get_playlist(format, topics, options, seed=seed, length=seconds, tenant=selected)
+                search = '?' + urlencode(dict(
+                    tenant=tenant,
+                    format=format,
+                    topics=','.join(topics),
+                    options=','.join(options),
+                    length=length,
+                    seed=seed,
+                ))
+            if not playlist:
+                return dict(
+                    player_store=no_update,
+                    start_button_text=no_update,
+                    url=no_update,
+                    prefetch=no_update,
+                    mobile_burger=no_update,
+                    desktop_burger=no_update,
+                    app_store=no_update,
+                    search=no_update,
+                    seed=no_update,
+                    error='No clips for this selection',
+                )
+
+            continuous = continuous and all(clip.segments for clip in playlist)
+            queue = queued = None
+            if order == Order.SPACED and not continuous:
+                queue = queue_playlist(playlist)
+                queued = pop_queued(queue)
+            session = PlaylistSession(
+                tenant=tenant,
+                playlist=[clip.id for clip in playlist] if queue is None else [playlist[0].id],
+                quality=quality,
+                continuous=continuous,
+                queue=queue,
+                queued=queued,
+            )
+            token = sessions.create(session)
+            analytics.record(EventType.SESSION_STARTED, token, position=len(playlist))
+
+            if continuous:
+                url = f'video/session/{token}.m3u8'
+                prefetch = []
+                chapters = chapter_starts(playlist)
+            else:
+                url = get_clip_url(playlist[0], quality, throughput)
+                prefetch = player.prefetch_videos(session, 0, throughput)
+                chapters = None
 
             return dict(
-                player_store=remaining_playlist,
+                player_store=PlayerStore(session=token, cursor=0, chapters=chapters),
                 start_button_text='Restart',
-                url=first_video['url'],
+                url=url,
+                prefetch=prefetch,
                 mobile_burger=False,
                 desktop_burger=False,
                 app_store=AppStore(active=player.id, last=None, finished=False),
+                search=search,
+                seed=None,
+                error=None,
             )
 
-        @callback(
-            output=dict(
-                contact_button_text=Output(self.contact_button_id, 'children'),
-                app_store=Output(app_store, 'data', allow_duplicate=True),
-                playing=Output(player.video, 'playing', allow_duplicate=True)
-            ),
-            inputs=dict(
-                btn=Input(self.contact_button_id, 'n_clicks')
-            ),
-            state=dict(
-                currently_hidden=State(contact_form, 'hidden'),
-                old_app_store=State(app_store, 'data'),
-            ),
-            prevent_initial_call=True
+        # Selections from a shared session url are applied once, when the page loads
+        clientside_callback(
+            f'''
+            (id, search) => {{
+                const no_update = window.dash_clientside.no_update;
+                const params = new URLSearchParams(search || '');
+                if (!params.has('seed')) {{
+                    return [no_update, no_update, no_update, no_update, no_update, no_update, no_update];
+                }}
+                const list = (name, valid) => (params.get(name) || '').split(',').filter(v => valid.includes(v));
+                const tenant = params.get('tenant');
+                const format = params.get('format');
+                const length = params.get('length');
+                const seed = parseInt(params.get('seed'), 10);
+                return [
+                    {json.dumps([str(tenant) for tenant in tenants])}.includes(tenant) ? tenant : no_update,
+                    {json.dumps(Format.all())}.includes(format) ? format : no_update,
+                    list('topics', {json.dumps(Topic.all())}),
+                    list('options', {json.dumps(Option.all())}),
+                    '{Order.SHUFFLE}',
+                    {json.dumps(list(Length))}.includes(length) ? length : '{Length.FULL}',
+                    Number.isNaN(seed) ? null : seed,
+                ];
+            }}
+            ''',
+            Output('tenant', 'value'),
+            Output('format', 'value'),
+            Output('topics', 'value'),
+            Output('options', 'value'),
+            Output('order', 'value'),
+            Output('length', 'value'),
+            Output(self.seed_store_id, 'data', allow_duplicate=True),
+            Input(self.seed_store_id, 'id'),
+            State(location, 'search'),
+            prevent_initial_call='initial_duplicate',
         )
-        def contact_button_click(currently_hidden, old_app_store: Dict[str, str], **kwargs) -> Dict[str, Union[bool, str]]:
-            '''
-                Hides/Shows the contact form, modifies the contact button text based on new state, and
-                pauses playback if mid-session
-            '''
-            if currently_hidden:
-                last = old_app_store.get('active')
-                return dict(
-                    contact_button_text='Close Contact Form',
-                    app_store=AppStore(
-                        active=contact_form,
-                        last=last,
-                        finished=old_app_store.get('finished')
-                    ),
-                    playing=False if last == player.id else no_update
-                )
 
-            else:
-                active = old_app_store.get('last')
-                return dict(
-                    contact_button_text='Contact Us',
-                    app_store=AppStore(
-                        active=active,
-                        last=contact_form,
-                        finished=old_app_store.get('finished')
-                    ),
-                    playing=True if active == player.id else no_update
-                )
+        clientside_callback(
+            f'''
+            (n, currentlyHidden, appStore) => {{
+                const no_update = window.dash_clientside.no_update;
+                if (currentlyHidden) {{
+                    const last = appStore.active;
+                    return [
+                        'Close Contact Form',
+                        {{active: '{contact_form}', last: last, finished: appStore.finished}},
+                        last === '{player.id}' ? false : no_update,
+                    ];
+                }}
+                const active = appStore.last;
+                return [
+                    'Contact Us',
+                    {{active: active, last: '{contact_form}', finished: appStore.finished}},
+                    active === '{player.id}' ? true : no_update,
+                ];
+            }}
+            ''',
+            Output(self.contact_button_id, 'children'),
+            Output(app_store, 'data', allow_duplicate=True),
+            Output(player.video, 'playing', allow_duplicate=True),
+            Input(self.contact_button_id, 'n_clicks'),
+            State(contact_form, 'hidden'),
+            State(app_store, 'data'),
+            prevent_initial_call=True
+        )
@@ -1,9 +1,20 @@
 from typing import Dict, List
 
+import dash_mantine_components as dmc
 import dash_player as dp
-from dash import Input, Output, State, callback, dcc, html, no_update
+from dash import Input, Output, State, callback, clientside_callback, ctx, dcc, html, no_update
+from dash_iconify import DashIconify
 
-from src.models import AppStore, Clip
+from src import analytics
+from src.analytics import EventType
+from src.clips import ClipCatalog, get_clip_url, get_session_catalog
+from src.models import AppStore, Clip, PlayerStore, PlaylistSession, Quality
+from src.scheduler import Progress, peek_queued, pop_queued, requeue, review
+from src.sessions import get_store
+
+
+# How many upcoming clips the browser fetches ahead of playback
+PREFETCH_COUNT = 2
 
 
 class Player(html.Div):
@@ -19,13 +30,23 @@ class Player(html.Div):
         '''
         self.id = 'player'
         self.video = 'video'
+        self.chapter = 'player_chapter'
         self.store = 'player_store'
+        self.ended = 'player_ended'
+        self.prefetch = 'player_prefetch'
+        self.throughput = 'player_throughput'
+        self.progress = 'practice_progress'
+        self.correct = 'answer_correct'
+        self.missed = 'answer_missed'
 
         super().__init__(
             id=self.id,
             hidden=True,
             children=[
-                dcc.Store(id=self.store, storage_type='session', data=[]),
+                dcc.Store(id=self.store, storage_type='session', data=PlayerStore(session=None, cursor=0, chapters=None)),
+                dcc.Store(id=self.ended, data=None),
+                dcc.Store(id=self.throughput, storage_type='session', data=None),
+                dcc.Store(id=self.progress, storage_type='local', data={}),
                 dp.DashPlayer(
                     id=self.video,
                     url=None,
@@ -34,60 +55,255 @@ class Player(html.Div):
                     intervalCurrentTime=500,
                     style={'maxWidth': '100%'}
                 ),
+                dmc.Text(id=self.chapter, size='sm', c='dimmed', mt='xs'),
+                dmc.Group(
+                    [
+                        dmc.Button(
+                            'Missed It',
+                            id=self.missed,
+                            leftSection=DashIconify(icon='iconamoon:close-bold'),
+                            variant='outline',
+                        ),
+                        dmc.Button(
+                            'Got It',
+                            id=self.correct,
+                            leftSection=DashIconify(icon='iconamoon:check-bold'),
+                        ),
+                    ],
+                    mt='sm',
+                ),
+                html.Div(id=self.prefetch, hidden=True, children=[]),
             ]
         )
 
-        @callback(
+        clientside_callback(
+            '''
+            (url) => Boolean(url)
+            ''',
             Output(self.video, 'playing'),
             Input(self.video, 'url')
         )
-        def toggle_playing(url: str) -> bool:
-            return bool(url)
+
+        # A continuous session is one video, so its position is shown from the start times of its clips
+        clientside_callback(
+            '''
+            (playerStore) => playerStore && playerStore.chapters
+                ? `Clip ${playerStore.cursor + 1} of ${playerStore.chapters.length}`
+                : ''
+            ''',
+            Output(self.chapter, 'children'),
+            Input(self.store, 'data'),
+        )
+
+        # The current time is polled every 500 ms while a clip plays, so the end of the clip is detected in the
+        # browser. The server is only called once per clip, when `ended` records the session and cursor that finished.
+        # In a continuous session a clip ends when the next one starts, at its chapter start time.
+        # At the same time the download throughput of recent clips is measured, for `Quality.AUTO`.
+        clientside_callback(
+            '''
+            (currentTime, duration, url, playerStore, ended) => {
+                const no_update = window.dash_clientside.no_update;
+                if (!url || !duration || !playerStore) {
+                    return [no_update, no_update];
+                }
+                const chapters = playerStore.chapters;
+                const next = chapters ? chapters[playerStore.cursor + 1] : undefined;
+                if (currentTime < (next === undefined ? duration : next)) {
+                    return [no_update, no_update];
+                }
+                if (ended && ended.session === playerStore.session && ended.cursor === playerStore.cursor) {
+                    return [no_update, no_update];
+                }
+
+                const recent = performance.getEntriesByType('resource')
+                    .filter(e => e.name.includes('/video/') && e.transferSize > 0 && e.responseEnd > e.requestStart)
+                    .slice(-5);
+                const bits = recent.reduce((total, e) => total + e.transferSize * 8, 0);
+                const ms = recent.reduce((total, e) => total + e.responseEnd - e.requestStart, 0);
+                const mbps = ms ? bits / ms / 1000 : (navigator.connection ? navigator.connection.downlink : null);
+
+                return [{session: playerStore.session, cursor: playerStore.cursor}, mbps || no_update];
+            }
+            ''',
+            Output(self.ended, 'data'),
+            Output(self.throughput, 'data'),
+            Input(self.video, 'currentTime'),
+            State(self.video, 'duration'),
+            State(self.video, 'url'),
+            State(self.store, 'data'),
+            State(self.ended, 'data'),
+            prevent_initial_call=True
+        )
 
         @callback(
             output=dict(
                 url=Output(self.video, 'url', allow_duplicate=True,),
-                new_playlist=Output(self.store, 'data', allow_duplicate=True),
+                player_store=Output(self.store, 'data', allow_duplicate=True),
+                prefetch=Output(self.prefetch, 'children', allow_duplicate=True),
                 app_store=Output(app_store, 'data', allow_duplicate=True),
             ),
             inputs=dict(
-                current_time=Input(self.video, 'currentTime'),
+                ended=Input(self.ended, 'data'),
             ),
             state=dict(
-                duration=State(self.video, 'duration'),
-                url=State(self.video, 'url'),
-                playlist=State(self.store, 'data')
+                player_store=State(self.store, 'data'),
+                throughput=State(self.throughput, 'data'),
             ),
             prevent_initial_call=True
         )
-        def play_next_video(current_time: float, duration: float, url: None | str, playlist: List[Clip]) -> Dict[str, Dict | bool]:
+        def play_next_video(ended: PlayerStore | None, player_store: PlayerStore, throughput: float | None) -> Dict[str, Dict | bool]:
             '''
-                When the current_time changes, check if the full video time has elapsed.
+                When a video has reached the end, advance to the next video in the session playlist.
+
+                If the session playlist has items remaining, set the url of the next video in the session quality,
+                and advance the cursor. A spaced repetition session takes its next clip off its queue instead, which
+                the answer to the clip that ended may have added to.
 
-                If so, and the store has items remaining, set the next video url and advance the playlist
+                A continuous session keeps playing the same video, so only the cursor advances, to the clip that has
+                started.
 
-                If the store is empty, clear the video url and the playlist
+                If the playlist is exhausted, the session has expired or its clip library has been removed, clear the
+                video url and the session
 
-                If the full video time has not yet elapsed, do nothing.
+                If the ended video is not the current one (e.g. the playlist was restarted), do nothing.
             '''
             new_url = no_update
-            new_playlist = no_update
+            new_player_store = no_update
+            prefetch = no_update
             app_store = no_update
 
-            if current_time == duration and url is not None:
-                # video has reached the end
-                try:
-                    next_video, *remaining_playlist = playlist
-                    new_url = next_video['url']
-                    new_playlist = remaining_playlist
-                except ValueError:
+            if ended and (ended['session'], ended['cursor']) == (player_store['session'], player_store['cursor']):
+                sessions = get_store()
+                token = player_store.get('session')
+                cursor = player_store.get('cursor', 0) + 1
+                session: PlaylistSession | None = sessions.get(token) if token else None
+                catalog = get_session_catalog(session) if session else None
+                if catalog is None:
+                    session = None
+
+                clip = None
+                if session:
+                    ended_clip = catalog.get_clip(session['playlist'][cursor - 1])
+                    analytics.record(EventType.CLIP_PLAYED, token, ended_clip, cursor - 1)
+                    if session.get('queue') is not None:
+                        clip = self.play_queued(session, catalog)
+                        cursor = len(session['playlist']) - 1
+                        sessions.set(token, session)
+                    elif not session['continuous']:
+                        # clips removed from the library while the session was playing are skipped
+                        cursor, clip = catalog.find_clip(session['playlist'], cursor)
+
+                if session and session['continuous'] and cursor < len(session['playlist']):
+                    new_player_store = PlayerStore(session=token, cursor=cursor, chapters=player_store.get('chapters'))
+                elif clip:
+                    new_url = get_clip_url(clip, session['quality'], throughput)
+                    new_player_store = PlayerStore(session=token, cursor=cursor, chapters=None)
+                    prefetch = self.prefetch_videos(session, cursor, throughput)
+                else:
                     # end of the playlist
+                    if session:
+                        analytics.record(EventType.SESSION_FINISHED, token, position=len(session['playlist']))
+                    if token:
+                        sessions.delete(token)
                     new_url = None
-                    new_playlist = []
+                    new_player_store = PlayerStore(session=None, cursor=0, chapters=None)
+                    prefetch = []
                     app_store = AppStore(active=splash, last=None, finished=True)
 
             return dict(
                 url=new_url,
-                new_playlist=new_playlist,
+                player_store=new_player_store,
+                prefetch=prefetch,
                 app_store=app_store,
             )
+
+        # each clip can be answered once, so the answer buttons are enabled again whenever the clip changes
+        clientside_callback(
+            '''
+            (playerStore) => [false, false]
+            ''',
+            Output(self.correct, 'disabled'),
+            Output(self.missed, 'disabled'),
+            Input(self.store, 'data'),
+        )
+
+        @callback(
+            output=dict(
+                progress=Output(self.progress, 'data'),
+                correct_disabled=Output(self.correct, 'disabled', allow_duplicate=True),
+                missed_disabled=Output(self.missed, 'disabled', allow_duplicate=True),
+            ),
+            inputs=dict(
+                correct=Input(self.correct, 'n_clicks'),
+                missed=Input(self.missed, 'n_clicks'),
+            ),
+            state=dict(
+                player_store=State(self.store, 'data'),
+                progress=State(self.progress, 'data'),
+            ),
+            prevent_initial_call=True
+        )
+        def record_answer(player_store: PlayerStore, progress: Progress | None, **kwargs) -> Dict[str, Dict | bool]:
+            '''
+                Records whether the current clip was answered correctly, for spaced repetition.
+
+                A clip that is missed in a spaced repetition session is queued to come back later in the session.
+            '''
+            sessions = get_store()
+            token = player_store.get('session')
+            session: PlaylistSession | None = sessions.get(token) if token else None
+            catalog = get_session_catalog(session) if session else None
+            if catalog is None:
+                return dict(progress=no_update, correct_disabled=no_update, missed_disabled=no_update)
+
+            clip = catalog.get_clip(session['playlist'][player_store['cursor']])
+            if clip is None or clip.topic is None:
+                # intro and outro clips are not practiced, nor are clips removed from the library
+                return dict(progress=no_update, correct_disabled=True, missed_disabled=True)
+
+            correct = ctx.triggered_id == self.correct
+            queued = session.get('queued')
+            if queued and queued[-1] == clip.id:
+                # each play of a clip is answered once
+                if not correct:
+                    requeue(session['queue'], queued)
+                session['queued'] = None
+                sessions.set(token, session)
+
+            return dict(
+                progress=review(progress, clip, correct=correct),
+                correct_disabled=True,
+                missed_disabled=True,
+            )
+
+    @staticmethod
+    def prefetch_videos(session: PlaylistSession, cursor: int, throughput: float | None) -> List[html.Video]:
+        '''
+            Renders hidden videos for the clips after `cursor`, so the browser has them cached before they are played
+        '''
+        if session.get('queue') is not None:
+            upcoming = peek_queued(session['queue'], PREFETCH_COUNT)
+        else:
+            upcoming = session['playlist'][cursor + 1:cursor + 1 + PREFETCH_COUNT]
+
+        catalog = get_session_catalog(session)
+        if catalog is None:
+            return []
+        return [
+            html.Video(src=get_clip_url(clip, session['quality'], throughput), preload='auto', muted=True)
+            for clip in catalog.get_clips(upcoming)
+        ]
+
+    @staticmethod
+    def play_queued(session: PlaylistSession, catalog: ClipCatalog) -> Clip | None:
+        '''
+            Takes the next clip of a spaced repetition session off its queue and adds it to the playlist, skipping
+            clips removed from the library. Returns None once the queue is empty.
+        '''
+        while (entry := pop_queued(session['queue'])) is not None:
+            clip = catalog.get_clip(entry[-1])
+            if clip:
+                session['playlist'].append(clip.id)
+                session['queued'] = entry
+                return clip
+        return None
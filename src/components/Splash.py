@@ -1,11 +1,7 @@
-from typing import Dict, List
-
 import dash_mantine_components as dmc
-from dash import Input, Output, callback, html
+from dash import Input, Output, clientside_callback, html
 from dash_iconify import DashIconify
 
-from src.models import AppStore
-
 
 class Splash(html.Div):
     '''
@@ -100,6 +96,15 @@ class Splash(html.Div):
                                     dmc.Text('Outro', span=True, c='grape', inherit=True,),
                                     ' to hear some parting words after you have completed practice.'
                                 ]),
+                                dmc.Text(children=[
+                                    'Choose ',
+                                    dmc.Text('Spaced Repetition', span=True, c='grape', inherit=True,),
+                                    ' to practice the clips you missed or have not seen in a while first. Click ',
+                                    dmc.Text('Got It', span=True, c='grape', inherit=True,),
+                                    ' or ',
+                                    dmc.Text('Missed It', span=True, c='grape', inherit=True,),
+                                    ' after each clip to track your progress.'
+                                ]),
                             ],
                             inheritPadding=True,
                             mt='sm',
@@ -183,38 +188,13 @@ class Splash(html.Div):
             ],
         )
 
-        @callback(
-            Input(app_store, 'data'),
-            output=dict(
-                welcome_open=Output(self.welcome, 'opened', allow_duplicate=True),
-                finished_open=Output(self.finished, 'opened', allow_duplicate=True),
-            ),
-            prevent_initial_call=True,
-        )
-        def toggle_content(app_store: AppStore) -> Dict[str, bool | List]:
-            '''
-                Shows or hides the Splash contents depending on the finished state
-            '''
-            finished_open = app_store['finished']
-            return dict(
-                finished_open=finished_open,
-                welcome_open=not finished_open,
-            )
-
-        @callback(
+        clientside_callback(
+            f'''
+            (n) => [{{active: '{self.id}', last: null, finished: false}}, true, true]
+            ''',
+            Output(app_store, 'data', allow_duplicate=True),
+            Output('mobile-burger', 'opened', allow_duplicate=True),
+            Output('desktop-burger', 'opened', allow_duplicate=True),
             Input('restart', 'n_clicks'),
-            output=dict(
-                welcome_open=Output(self.welcome, 'opened', allow_duplicate=True),
-                finished_open=Output(self.finished, 'opened', allow_duplicate=True),
-                mobile_burger=Output('mobile-burger', 'opened', allow_duplicate=True),
-                desktop_burger=Output('desktop-burger', 'opened', allow_duplicate=True),
-            ),
             prevent_initial_call=True,
         )
-        def restart(_):
-            return dict(
-                welcome_open=True,
-                finished_open=False,
-                mobile_burger=True,
-                desktop_burger=True,
-            )
@@ -0,0 +1,77 @@
+import math
+import posixpath
+from pathlib import Path
+from typing import List, Tuple
+
+from src.models import Clip
+
+
+def parse_media_playlist(path: Path) -> List[Tuple[float, Path]]:
+    '''
+        Reads the `(duration, segment path)` pairs of a VOD media playlist written by ffmpeg's hls muxer
+    '''
+    segments = []
+    duration = None
+
+    for line in path.read_text().splitlines():
+        line = line.strip()
+        if line.startswith('#EXTINF:'):
+            duration = float(line[len('#EXTINF:'):].split(',', 1)[0])
+        elif line and not line.startswith('#'):
+            if duration is None:
+                raise ValueError(f'Segment {line} in {path} has no duration')
+            segments.append((duration, path.parent / line))
+            duration = None
+
+    return segments
+
+
+def chapter_starts(playlist: List[Clip]) -> List[float]:
+    '''
+        Gets the time in seconds at which each clip of a session playlist starts, once its segments are joined by
+        `session_playlist`
+    '''
+    starts = []
+    start = 0.0
+    for clip in playlist:
+        starts.append(start)
+        start += sum(s.duration for s in clip.segments)
+    return starts
+
+
+def relative_url(url: str, directory: str) -> str:
+    '''
+        Gets a url relative to the app, like `video/{digest}.ts`, relative to the `directory` of the playlist instead
+    '''
+    path, separator, query = url.partition('?')
+    return posixpath.relpath(path, directory) + separator + query
+
+
+def session_playlist(playlist: List[Clip], directory: str = 'video/session') -> str:
+    '''
+        Joins the segments of every clip into a single VOD media playlist, so that a practice session streams as one
+        media timeline. Each clip starts at a discontinuity, since the clips were encoded separately.
+
+        Segment urls are relative to the `directory` the playlist is served from, so that it also works when the app
+        is served under a path prefix.
+    '''
+    segments = [segment for clip in playlist for segment in clip.segments]
+    target_duration = math.ceil(max((s.duration for s in segments), default=1))
+
+    lines = [
+        '#EXTM3U',
+        '#EXT-X-VERSION:3',
+        '#EXT-X-PLAYLIST-TYPE:VOD',
+        f'#EXT-X-TARGETDURATION:{target_duration}',
+        '#EXT-X-MEDIA-SEQUENCE:0',
+    ]
+    for i, clip in enumerate(playlist):
+        if i:
+            lines.append('#EXT-X-DISCONTINUITY')
+        for segment in clip.segments:
+            lines.append(f'#EXTINF:{segment.duration:.3f},{clip.name}')
+            lines.append(relative_url(segment.url, directory))
+    lines.append('#EXT-X-ENDLIST')
+
+    return '\n'.join(lines) + '\n'
+
@@ -0,0 +1,162 @@
+import dash_mantine_components as dmc
+from dash import Dash, Input, Output, State, clientside_callback, dcc
+
+from src.components import ContactForm, NavBar, Player, Splash, ThemeToggle
+from src.models import AppStore
+
+
+def init_layout(app: Dash) -> None:
+    '''
+        Builds the components and page layout of the app, and registers the callbacks that switch between views
+    '''
+    app_store_id = 'app_store'
+
+    location_id = 'url'
+
+    splash = Splash(app_store=app_store_id)
+
+    player = Player(app_store=app_store_id, splash=splash.id)
+
+    contact_form = ContactForm()
+
+    layout = dmc.AppShell(
+        [
+            dmc.AppShellHeader(
+                dmc.Group(
+                    [
+                        dmc.Group(
+                            [
+                                dmc.Burger(
+                                    id='mobile-burger',
+                                    size='sm',
+                                    hiddenFrom='sm',
+                                    opened=False,
+                                ),
+                                dmc.Burger(
+                                    id="desktop-burger",
+                                    size="sm",
+                                    visibleFrom="sm",
+                                    opened=True,
+                                ),
+                                dmc.Title(
+                                    'Roller Derby Signals and Cues Practice',
+                                    id='mobile-title',
+                                    order=6,
+                                    hiddenFrom='sm'
+                                ),
+                                dmc.Title(
+                                    'Roller Derby Hand Signals and Verbal Cues Practice',
+                                    id='desktop-title',
+                                    order=3,
+                                    visibleFrom='sm'
+                                ),
+
+                            ],
+                            gap='xs',
+                            wrap='nowrap',
+                        ),
+                        ThemeToggle(),
+                    ],
+                    gap='xs',
+                    wrap='nowrap',
+                    justify='space-between',
+                    h="100%",
+                    px="md",
+                ),
+            ),
+            NavBar(
+                player=player,
+                contact_form=contact_form.id,
+                app_store=app_store_id,
+                location=location_id,
+            ),
+            dmc.AppShellMain([
+                splash,
+                player,
+                contact_form,
+            ]),
+            dmc.AppShellFooter(
+                dmc.Text(children=[
+                    'Thank you to ',
+                    dmc.Anchor(
+                        "Axis of Stevil",
+                        href="https://www.youtube.com/feed/subscriptions/UCgxwwxOVwKbMNmivt-ImKJQ",
+                        c='grape'
+                    ),
+                    ', who graciously allowed me to use his video content to create this app.',
+                ]
+                ),
+                px="md",
+                display='flex',
+                style={'align-items': 'center'},
+            )
+        ],
+        header={
+            "height": 60,
+            "offset": True,
+        },
+        footer={
+            "height": {'sm': 80, 'lg': 60},
+            "offset": True,
+        },
+        navbar={
+            "width": 300,
+            "breakpoint": "sm",
+            "collapsed": {"mobile": True, "desktop": False},
+        },
+        padding="md",
+        id="appshell",
+    )
+
+    app.layout = dmc.MantineProvider(
+        [
+            dcc.Store(
+                id=app_store_id,
+                storage_type='session',
+                data=AppStore(active=splash.id, last=None, finished=False),
+            ),
+            dcc.Location(id=location_id, refresh=False),
+            layout
+        ],
+        id='provider',
+        theme={
+            "primaryColor": 'grape',
+        },
+    )
+
+    clientside_callback(
+        '''
+        (mobileOpened, desktopOpened, navbar) => ({
+            ...navbar,
+            collapsed: {mobile: !mobileOpened, desktop: !desktopOpened},
+        })
+        ''',
+        Output("appshell", "navbar"),
+        Input("mobile-burger", "opened"),
+        Input("desktop-burger", "opened"),
+        State("appshell", "navbar"),
+    )
+
+    # Every view change goes through the app store, and this one clientside callback derives which content is visible
+    # from it, so a view change costs no server requests.
+    clientside_callback(
+        f'''
+        (appStore) => {{
+            const active = appStore.active;
+            return [
+                active !== '{splash.id}',
+                active !== '{player.id}',
+                active !== '{contact_form.id}',
+                !appStore.finished,
+                Boolean(appStore.finished),
+            ];
+        }}
+        ''',
+        Output(splash.id, 'hidden'),
+        Output(player.id, 'hidden'),
+        Output(contact_form.id, 'hidden'),
+        Output(splash.welcome, 'opened'),
+        Output(splash.finished, 'opened'),
+        Input(app_store_id, 'data'),
+        prevent_initial_call=True
+    )
@@ -0,0 +1,85 @@
+import gzip
+import hashlib
+import os
+import threading
+from typing import Dict
+
+from dash import Dash
+from flask import Response, request
+
+try:
+    import brotli
+except ImportError:  # installed with the requirements, but gzip is still used without it
+    brotli = None
+
+
+class PrerenderedLayout:
+    '''
+        The app layout, serialized once and stored with each content encoding the browser may accept. Each encoding has
+        its own strong ETag, since caches must not revalidate the bytes of one encoding with another's.
+
+        Args:
+            app (Dash): The app whose layout is served
+    '''
+
+    def __init__(self, app: Dash):
+        body = app.serve_layout().get_data()
+
+        etag = hashlib.sha256(body).hexdigest()[:20]
+        self.bodies: Dict[str, bytes] = {
+            'identity': body,
+            'gzip': gzip.compress(body, compresslevel=9, mtime=0),
+        }
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(body, quality=11)
+        self.etags: Dict[str, str] = {encoding: f'{etag}-{encoding}' for encoding in self.bodies}
+
+    def response(self) -> Response:
+        '''
+            Responds to the current request with 304 not modified when the browser has the layout cached in any
+            encoding, or with the smallest encoding it accepts
+        '''
+        cached = next((etag for etag in self.etags.values() if etag in request.if_none_match), None)
+        if cached:
+            response = Response(status=304)
+            response.set_etag(cached)
+        else:
+            accepted = [e for e in self.bodies if e == 'identity' or request.accept_encodings[e]]
+            encoding = min(accepted, key=lambda e: len(self.bodies[e]))
+
+            response = Response(self.bodies[encoding], mimetype='application/json')
+            response.set_etag(self.etags[encoding])
+            if encoding != 'identity':
+                response.content_encoding = encoding
+
+        response.vary.add('Accept-Encoding')
+        # the layout changes on deploy, so browsers revalidate it with the ETag every time
+        response.cache_control.no_cache = True
+        return response
+
+
+def init_prerendered_layout(app: Dash) -> None:
+    '''
+        Serves `_dash-layout` from a layout serialized on the first request, when `PRERENDER_LAYOUT` is set.
+
+        Only use this when the layout is static, i.e. it does not depend on the request.
+    '''
+    if not os.getenv('PRERENDER_LAYOUT'):
+        return
+
+    layout_path = f"{app.config.routes_pathname_prefix}_dash-layout"
+    lock = threading.Lock()
+    prerendered: PrerenderedLayout | None = None
+
+    @app.server.before_request
+    def serve_prerendered_layout():
+        nonlocal prerendered
+        if request.method != 'GET' or request.path != layout_path:
+            return None
+
+        if prerendered is None:
+            with lock:
+                if prerendered is None:
+                    prerendered = PrerenderedLayout(app)
+
+        return prerendered.response()
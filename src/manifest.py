@@ -0,0 +1,396 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple, TypedDict
+
+from src.hls import parse_media_playlist
+from src.models import Format, Quality, Tenant, Topic
+from src.mp4 import Mp4Metadata, read_metadata
+
+try:
+    import fcntl
+except ImportError:  # not on Windows, where the app runs in a single process
+    fcntl = None
+
+SRC_DIR = Path(__file__).parent
+
+STATIC_DIR = SRC_DIR / 'static'
+
+RENDITIONS_DIR = SRC_DIR / 'renditions'
+
+# Clip libraries of other rule sets and languages, laid out like `tenants/{RuleSet}/{language}/{Format}/{Topic}/*.mp4`
+TENANTS_DIR = SRC_DIR / 'tenants'
+
+MANIFEST_PATH = Path(os.getenv('CLIP_MANIFEST', SRC_DIR / 'clip_manifest.json'))
+
+MANIFEST_VERSION = 6
+
+
+class FileEntry(TypedDict):
+    path: str
+    size: int
+    mtime: int
+    digest: str
+
+
+class SegmentEntry(FileEntry):
+    duration: float
+
+
+class ManifestEntry(FileEntry):
+    id: int | None
+    format: Format | None
+    topic: Topic | None
+    duration: float | None
+    width: int | None
+    height: int | None
+    bitrate: int | None
+    renditions: Dict[Quality, FileEntry]
+    poster: FileEntry | None
+    segments: List[SegmentEntry]
+
+
+class Manifest(TypedDict):
+    version: int
+    directories: Dict[str, int]
+    clips: List[ManifestEntry]
+
+
+def entry_files(entry: ManifestEntry) -> List[FileEntry]:
+    '''
+        Lists the clip file and every file produced for it: renditions, poster and HLS segments
+    '''
+    return [f for f in [entry, *entry['renditions'].values(), entry['poster'], *entry['segments']] if f]
+
+
+def tenant_dir(tenant: Tenant) -> Path:
+    '''
+        Gets the directory of a tenant's clip library. The default tenant's clips are in `static/`.
+    '''
+    if tenant == Tenant.get_default_option():
+        return STATIC_DIR
+    return TENANTS_DIR / tenant.rule_set / tenant.language
+
+
+def tenant_manifest_path(tenant: Tenant) -> Path:
+    '''
+        Gets the path of a tenant's manifest, next to the default manifest
+    '''
+    if tenant == Tenant.get_default_option():
+        return MANIFEST_PATH
+    return MANIFEST_PATH.with_name(f'{MANIFEST_PATH.stem}.{tenant.rule_set}.{tenant.language}{MANIFEST_PATH.suffix}')
+
+
+def list_tenants() -> List[Tenant]:
+    '''
+        Lists the default tenant and every tenant with a clip library in the tenants directory
+    '''
+    tenants = [Tenant.get_default_option()]
+    for directory in sorted(TENANTS_DIR.glob('*/*')):
+        try:
+            tenant = Tenant.parse(f'{directory.parent.name}/{directory.name}')
+        except ValueError:
+            continue
+        if directory.is_dir() and tenant not in tenants:
+            tenants.append(tenant)
+    return tenants
+
+
+def load_tenant(tenant: Tenant) -> Manifest:
+    return load(tenant_manifest_path(tenant), tenant_dir(tenant))
+
+
+def classify(path: Path) -> Tuple[Format | None, Topic | None]:
+    '''
+        Gets the format and topic of a clip from its location under the static directory
+
+        Clips are expected to be organized like `static/{Format}/{Topic}/{*.mp4}`, except for the intro clips
+        at `static/{Format}/intro*` and the outro clip at `static/outro*`.
+
+        Raises ValueError if the subfolder names are not valid `Format`s or `Topic`s.
+    '''
+    if "intro" in path.name:
+        return Format(path.parent.name), None
+    elif "outro" in path.name:
+        return None, None
+    else:
+        return Format(path.parent.parent.name), Topic(path.parent.name)
+
+
+def file_digest(path: Path) -> str:
+    '''
+        Gets a content hash of the file, used for ETags and cache-busting urls
+    '''
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha256').hexdigest()[:20]
+
+
+def file_entry(f: Path, previous: FileEntry | None) -> FileEntry:
+    '''
+        Describes a file, reusing the digest from the `previous` entry when its size and mtime have not changed
+    '''
+    stat = f.stat()
+    if previous and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime_ns:
+        digest = previous['digest']
+    else:
+        digest = file_digest(f)
+
+    return FileEntry(path=f.relative_to(SRC_DIR).as_posix(), size=stat.st_size, mtime=stat.st_mtime_ns, digest=digest)
+
+
+def rendition_path(digest: str, quality: Quality) -> Path:
+    return RENDITIONS_DIR / digest / f'{quality}.mp4'
+
+
+def poster_path(digest: str) -> Path:
+    return RENDITIONS_DIR / digest / 'poster.jpg'
+
+
+def hls_path(digest: str) -> Path:
+    return RENDITIONS_DIR / digest / 'hls' / 'index.m3u8'
+
+
+def scan_segments(digest: str, previous: List[SegmentEntry]) -> List[SegmentEntry]:
+    '''
+        Lists the HLS segments produced for a clip, or none when it has not been segmented
+    '''
+    path = hls_path(digest)
+    if not path.is_file():
+        return []
+
+    known = {s['path']: s for s in previous}
+    segments = []
+    for duration, f in parse_media_playlist(path):
+        entry = file_entry(f, known.get(f.relative_to(SRC_DIR).as_posix()))
+        segments.append(SegmentEntry(**entry, duration=duration))
+    return segments
+
+
+def scan_file(f: Path, old: ManifestEntry | None) -> ManifestEntry | None:
+    '''
+        Describes a clip file, with the renditions, poster and HLS segments produced for it by `src.transcode`.
+
+        Returns None when the file is not in a valid `Format`/`Topic` folder.
+    '''
+    try:
+        format, topic = classify(f)
+    except ValueError:
+        return None
+
+    entry = file_entry(f, old)
+    if old and old['digest'] == entry['digest']:
+        metadata = Mp4Metadata(old['duration'], old['width'], old['height'], old['bitrate'])
+    else:
+        try:
+            metadata = read_metadata(f)
+        except (OSError, ValueError):
+            metadata = Mp4Metadata(None, None, None, None)
+
+    renditions = {}
+    for quality in Quality.renditions():
+        path = rendition_path(entry['digest'], quality)
+        if path.is_file():
+            renditions[quality] = file_entry(path, old and old['renditions'].get(quality))
+
+    poster = poster_path(entry['digest'])
+
+    return ManifestEntry(
+        **entry,
+        id=old['id'] if old else None,
+        format=format,
+        topic=topic,
+        **metadata._asdict(),
+        renditions=renditions,
+        poster=file_entry(poster, old and old['poster']) if poster.is_file() else None,
+        segments=scan_segments(entry['digest'], old['segments'] if old else []),
+    )
+
+
+def scan_directory(directory: Path, known: Dict[str, ManifestEntry]) -> List[ManifestEntry]:
+    '''
+        Describes the clips directly inside one directory, reusing digests and metadata from the `known` entries
+    '''
+    entries = []
+    for f in sorted(directory.iterdir()):
+        if f.is_file():
+            entry = scan_file(f, known.get(f.relative_to(SRC_DIR).as_posix()))
+            if entry:
+                entries.append(entry)
+    return entries
+
+
+def assign_ids(entries: List[ManifestEntry], next_id: int) -> int:
+    '''
+        Numbers the entries that do not have a clip id yet, starting from `next_id`, and returns the next free id.
+
+        Ids are kept for as long as a file stays at the same path, so sessions keep referring to the same clip.
+    '''
+    for entry in entries:
+        if entry['id'] is None:
+            entry['id'] = next_id
+            next_id += 1
+    return next_id
+
+
+def scan(previous: Manifest | None = None, root: Path = STATIC_DIR) -> Manifest:
+    '''
+        Walks the `root` directory of a clip library and builds a manifest of every valid clip
+
+        Digests and metadata are reused from the `previous` manifest for files whose size and mtime have not changed.
+    '''
+    known = {e['path']: e for e in previous['clips']} if previous else {}
+
+    directories = {}
+    entries = []
+
+    for directory, _, _ in os.walk(root):
+        directory = Path(directory)
+        directories[directory.relative_to(SRC_DIR).as_posix()] = directory.stat().st_mtime_ns
+        entries.extend(scan_directory(directory, known))
+
+    assign_ids(entries, max((e['id'] for e in known.values()), default=-1) + 1)
+
+    return Manifest(version=MANIFEST_VERSION, directories=directories, clips=entries)
+
+
+def matches(path: Path, entry: FileEntry) -> bool:
+    '''
+        Checks that a file still has the size and mtime recorded in its entry, so its digest can be trusted
+    '''
+    try:
+        stat = path.stat()
+    except OSError:
+        return False
+    return stat.st_size == entry['size'] and stat.st_mtime_ns == entry['mtime']
+
+
+def is_stale(manifest: Manifest) -> bool:
+    '''
+        Checks whether files have been added, removed or renamed since the manifest was written, which changes the
+        mtime of their directory. Only the directories are checked, so that starting a worker does not stat every file.
+
+        Files overwritten in place are not noticed here, but are never served under their old digest, see
+        `src.video.send_content`. `python -m src.manifest` and `src.watcher` pick up their new content.
+    '''
+    for directory, mtime in manifest['directories'].items():
+        try:
+            if (SRC_DIR / directory).stat().st_mtime_ns != mtime:
+                return True
+        except OSError:
+            return True
+
+    return False
+
+
+def read(path: Path = MANIFEST_PATH) -> Manifest | None:
+    '''
+        Reads the manifest, returning None when it is missing, unreadable, from another version or stale
+    '''
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if manifest.get('version') != MANIFEST_VERSION or is_stale(manifest):
+        return None
+
+    for entry in manifest['clips']:
+        entry['format'] = Format(entry['format']) if entry['format'] else None
+        entry['topic'] = Topic(entry['topic']) if entry['topic'] else None
+        entry['renditions'] = {Quality(q): r for q, r in entry['renditions'].items()}
+
+    return manifest
+
+
+def read_previous(path: Path = MANIFEST_PATH) -> Manifest | None:
+    '''
+        Reads the manifest even when it is stale, so that its digests and metadata can be reused while rescanning.
+        Returns None when it is missing, unreadable or from another version.
+    '''
+    try:
+        with open(path) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return previous if previous.get('version') == MANIFEST_VERSION else None
+
+
+def write(manifest: Manifest, path: Path = MANIFEST_PATH) -> None:
+    '''
+        Writes the manifest atomically, so that workers starting concurrently never read a partial file
+    '''
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(tmp, path)
+
+
+def update(
+    directories: Iterable[Path],
+    removed: Iterable[str],
+    upserted: List[ManifestEntry],
+    path: Path = MANIFEST_PATH
+) -> None:
+    '''
+        Applies the changes to the clip library found by `src.watcher` to the manifest, and gives the `upserted`
+        entries their clip ids.
+
+        Each worker watches the library and finds the same changes, possibly in different batches. The manifest is
+        locked while it is updated, and a clip that is already in it keeps its id, so every worker gives a new clip
+        the id of the worker that found it first. Raises OSError when the manifest cannot be written.
+    '''
+    with open(path.with_name(f'{path.name}.lock'), 'a') as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+        current = read_previous(path) or Manifest(version=MANIFEST_VERSION, directories={}, clips=[])
+        clips = {e['path']: e for e in current['clips']}
+        for removed_path in removed:
+            clips.pop(removed_path, None)
+
+        next_id = max((e['id'] for e in clips.values()), default=-1) + 1
+        for entry in upserted:
+            old = clips.get(entry['path'])
+            entry['id'] = old['id'] if old else None
+            next_id = assign_ids([entry], next_id)
+            clips[entry['path']] = entry
+
+        for directory in directories:
+            key = directory.relative_to(SRC_DIR).as_posix()
+            if directory.is_dir():
+                current['directories'][key] = directory.stat().st_mtime_ns
+            else:
+                current['directories'] = {
+                    d: mtime for d, mtime in current['directories'].items() if d != key and not d.startswith(key + '/')
+                }
+
+        write(Manifest(version=MANIFEST_VERSION, directories=current['directories'], clips=list(clips.values())), path)
+
+
+def load(path: Path = MANIFEST_PATH, root: Path = STATIC_DIR) -> Manifest:
+    '''
+        Loads the manifest, falling back to walking the `root` directory when it is missing or stale.
+
+        After a fallback walk the manifest is rewritten (best effort), so that later workers can skip the walk.
+    '''
+    manifest = read(path)
+    if manifest is not None:
+        return manifest
+
+    manifest = scan(read_previous(path), root)
+    try:
+        write(manifest, path)
+    except OSError:
+        pass
+
+    return manifest
+
+
+if __name__ == '__main__':
+    for tenant in list_tenants():
+        path = tenant_manifest_path(tenant)
+        manifest = scan(read_previous(path), tenant_dir(tenant))
+        write(manifest, path)
+        print(f'Wrote {len(manifest["clips"])} {tenant} clips to {path}')
@@ -0,0 +1,148 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Dict, List
+
+from dash import Dash
+from flask import Response, abort, g, request
+
+LATENCY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+
+SIZE_BUCKETS = [128, 512, 1024, 4096, 16384, 65536, 262144, 1048576]
+
+# The Dash endpoints that are instrumented, by path suffix
+DASH_ENDPOINTS = {
+    '_dash-update-component': 'callback',
+    '_dash-layout': 'layout',
+    '_dash-dependencies': 'dependencies',
+}
+
+LOCAL_ADDRESSES = {'127.0.0.1', '::1'}
+
+
+class Histogram:
+    '''
+        A Prometheus-style cumulative histogram, with one series per callback
+
+        Args:
+            name (str): The metric name
+            help (str): The metric description
+            buckets (List[float]): The upper bounds of the buckets
+    '''
+
+    def __init__(self, name: str, help: str, buckets: List[float]):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self._counts: Dict[str, List[int]] = defaultdict(lambda: [0] * (len(buckets) + 1))
+        self._sums: Dict[str, float] = defaultdict(float)
+
+    def observe(self, callback: str, value: float) -> None:
+        # callers hold the lock of the `Metrics` that owns this histogram
+        self._counts[callback][bisect_left(self.buckets, value)] += 1
+        self._sums[callback] += value
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for callback, counts in sorted(self._counts.items()):
+            total = 0
+            for bound, count in zip([*self.buckets, '+Inf'], counts):
+                total += count
+                lines.append(f'{self.name}_bucket{{callback="{callback}",le="{bound}"}} {total}')
+            lines.append(f'{self.name}_sum{{callback="{callback}"}} {self._sums[callback]}')
+            lines.append(f'{self.name}_count{{callback="{callback}"}} {total}')
+        return lines
+
+
+class Metrics:
+    '''
+        Records the count, latency and request/response sizes of every Dash callback served by this process
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency = Histogram(
+            'dash_callback_duration_seconds', 'Time to handle a Dash callback request.', LATENCY_BUCKETS
+        )
+        self.request_size = Histogram(
+            'dash_callback_request_bytes', 'Size of the Dash callback request JSON.', SIZE_BUCKETS
+        )
+        self.response_size = Histogram(
+            'dash_callback_response_bytes', 'Size of the Dash callback response JSON.', SIZE_BUCKETS
+        )
+
+    def observe(self, callback: str, seconds: float, request_bytes: int, response_bytes: int) -> None:
+        with self._lock:
+            self.latency.observe(callback, seconds)
+            self.request_size.observe(callback, request_bytes)
+            self.response_size.observe(callback, response_bytes)
+
+    def render(self) -> str:
+        '''
+            Renders the metrics in the Prometheus text exposition format
+        '''
+        with self._lock:
+            lines = [
+                *self.latency.render(),
+                *self.request_size.render(),
+                *self.response_size.render(),
+            ]
+        return '\n'.join(lines) + '\n'
+
+
+def callback_name(app: Dash, output: str) -> str:
+    '''
+        Gets the function name of the callback for an output id, falling back to the output id itself
+    '''
+    callback = app.callback_map.get(output, {}).get('callback')
+    return getattr(callback, '__name__', output)
+
+
+def init_metrics(app: Dash) -> Metrics | None:
+    '''
+        Instruments the Dash endpoints and exposes the results at `/metrics`, when `METRICS_ENABLED` is set.
+
+        The endpoint only answers requests from the local host, unless `METRICS_ALLOW_REMOTE` is set.
+        Each gunicorn worker keeps its own metrics.
+    '''
+    if not os.getenv('METRICS_ENABLED'):
+        return None
+
+    metrics = Metrics()
+    server = app.server
+    allow_remote = bool(os.getenv('METRICS_ALLOW_REMOTE'))
+
+    @server.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @server.after_request
+    def record(response: Response) -> Response:
+        endpoint = request.path.rsplit('/', 1)[-1]
+        kind = DASH_ENDPOINTS.get(endpoint)
+        if kind is None or 'metrics_start' not in g:
+            return response
+
+        if kind == 'callback':
+            body = request.get_json(silent=True) or {}
+            name = callback_name(app, body.get('output', ''))
+        else:
+            name = kind
+
+        metrics.observe(
+            name,
+            time.perf_counter() - g.metrics_start,
+            request.content_length or 0,
+            response.calculate_content_length() or 0,
+        )
+        return response
+
+    @server.route('/metrics')
+    def serve_metrics() -> Response:
+        if not allow_remote and request.remote_addr not in LOCAL_ADDRESSES:
+            abort(404)
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    return metrics
@@ -1,5 +1,10 @@
+import re
+from dataclasses import dataclass
 from enum import StrEnum
-from typing import Dict, List, TypedDict
+from typing import Dict, List, Tuple, TypedDict
+
+# Language of the clips in `src/static`, see `Tenant`
+DEFAULT_LANGUAGE = 'en'
 
 
 class Option(StrEnum):
@@ -60,14 +65,176 @@ class Format(StrEnum):
         return cls.BOTH
 
 
-class Clip(TypedDict):
+class RuleSet(StrEnum):
+    WFTDA = 'wftda'
+    JRDA = 'jrda'
+    MRDA = 'mrda'
+
+    def label(self) -> str:
+        return self.upper()
+
+    @classmethod
+    def get_default_option(cls) -> 'RuleSet':
+        return cls.WFTDA
+
+
+@dataclass(frozen=True, slots=True)
+class Tenant:
+    '''
+        A clip library for one rule set in one language. Each has its own catalog, see `src.clips.get_catalog`.
+
+        Tenants are written like `wftda/en` in urls and sessions.
+    '''
+    rule_set: RuleSet
+    language: str
+
+    def __str__(self) -> str:
+        return f'{self.rule_set}/{self.language}'
+
+    def label(self) -> str:
+        return f'{self.rule_set.label()} ({self.language})'
+
+    @classmethod
+    def parse(cls, value: str) -> 'Tenant':
+        '''
+            Reads a tenant written like `wftda/en`, raising ValueError when it is not valid
+        '''
+        rule_set, _, language = value.partition('/')
+        if not re.fullmatch(r'[a-z]{2,3}(-[a-z0-9]+)*', language):
+            raise ValueError(f'Invalid language {language!r}')
+        return cls(RuleSet(rule_set), language)
+
+    @classmethod
+    def get_default_option(cls) -> 'Tenant':
+        return cls(RuleSet.get_default_option(), DEFAULT_LANGUAGE)
+
+
+class Order(StrEnum):
+    SHUFFLE = 'shuffle'
+    SPACED = 'spaced'
+
+    def label(self) -> str:
+        return 'Spaced Repetition' if self == Order.SPACED else self.title()
+
+    @classmethod
+    def get_options(cls) -> List[Dict[str, str]]:
+        '''
+            Returns a list of Order options for an html input component
+        '''
+        return [{'label': order.label(), 'value': order} for order in cls]
+
+    @classmethod
+    def get_default_option(cls) -> 'Order':
+        return cls.SHUFFLE
+
+
+class Length(StrEnum):
+    FULL = 'full'
+    TWO = '2'
+    FIVE = '5'
+    TEN = '10'
+
+    def label(self) -> str:
+        return 'All Clips' if self == Length.FULL else f'{self} min'
+
+    def seconds(self) -> int | None:
+        '''
+            Returns the target duration of a timed session, or None when every selected clip is played once
+        '''
+        return None if self == Length.FULL else int(self) * 60
+
+    @classmethod
+    def get_options(cls) -> List[Dict[str, str]]:
+        '''
+            Returns a list of Length options for an html input component
+        '''
+        return [{'label': length.label(), 'value': length} for length in cls]
+
+    @classmethod
+    def get_default_option(cls) -> 'Length':
+        return cls.FULL
+
+
+class Quality(StrEnum):
+    AUTO = 'auto'
+    LOW = 'low'
+    MEDIUM = 'medium'
+    HIGH = 'high'
+
+    @classmethod
+    def renditions(cls) -> List['Quality']:
+        return [cls.LOW, cls.MEDIUM, cls.HIGH]
+
+    @classmethod
+    def get_options(cls) -> List[Dict[str, str]]:
+        '''
+            Returns a list of Quality options for an html input component
+        '''
+        return [{'label': quality.title(), 'value': quality} for quality in cls]
+
+    @classmethod
+    def get_default_option(cls) -> 'Quality':
+        return cls.AUTO
+
+    @classmethod
+    def for_throughput(cls, mbps: float | None) -> 'Quality':
+        '''
+            Picks the rendition that the measured throughput can play without stalling
+        '''
+        if mbps is None:
+            return cls.MEDIUM
+        elif mbps >= 3:
+            return cls.HIGH
+        elif mbps >= 1.5:
+            return cls.MEDIUM
+        else:
+            return cls.LOW
+
+
+@dataclass(frozen=True, slots=True)
+class Segment:
+    url: str
+    duration: float
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class Clip:
+    '''
+        A clip in the catalog. Clips are shared by every playlist that includes them, and sessions refer to them
+        by `id`, so they are never copied or serialized. Progress and analytics refer to them by `key`, see
+        `src.scheduler.clip_key`.
+    '''
+    id: int
+    key: str
     format: Format | None
     topic: Topic | None
     name: str
     url: str
+    duration: float | None
+    renditions: Dict[Quality, str]
+    poster: str | None
+    segments: Tuple[Segment, ...]
 
 
 class AppStore(TypedDict):
     active: str
     last: str | None
     finished: bool
+
+
+class PlaylistSession(TypedDict):
+    tenant: str
+    playlist: List[int]
+    quality: Quality
+    continuous: bool
+    # spaced repetition sessions pick each next clip from a queue, see `src.scheduler.Queue`, and the playlist only
+    # holds the clips played so far. `queued` is the entry of the clip playing, until it has been answered.
+    queue: List[List[float]] | None
+    queued: List[float] | None
+
+
+class PlayerStore(TypedDict):
+    session: str | None
+    cursor: int
+    # start time in seconds of each clip of a continuous session, see `src.hls.chapter_starts`
+    chapters: List[float] | None
@@ -0,0 +1,84 @@
+import struct
+from pathlib import Path
+from typing import BinaryIO, Iterator, NamedTuple, Tuple
+
+# Atoms that hold the track headers, descended into while reading metadata
+CONTAINER_ATOMS = {b'moov', b'trak'}
+
+
+class Mp4Metadata(NamedTuple):
+    duration: float | None
+    width: int | None
+    height: int | None
+    bitrate: int | None
+
+
+def iter_atoms(f: BinaryIO, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    '''
+        Yields `(type, payload_offset, payload_size)` for every atom between `start` and `end`
+    '''
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, atom_type = struct.unpack('>I4s', f.read(8))
+        header = 8
+        if size == 1:
+            size, = struct.unpack('>Q', f.read(8))
+            header = 16
+        elif size == 0:
+            size = end - offset
+
+        if size < header:
+            raise ValueError(f'Invalid atom size {size} at offset {offset}')
+
+        yield atom_type, offset + header, size - header
+        offset += size
+
+
+def read_metadata(path: Path) -> Mp4Metadata:
+    '''
+        Reads the duration in seconds from the `moov/mvhd` atom of an mp4 file, the resolution from the largest
+        `moov/trak/tkhd` atom, and works out the average bitrate in bits per second from the file size.
+
+        Only the headers are read, so this is cheap even for large files. Fields are None when the file has no such
+        header, and ValueError is raised when the atoms are corrupt.
+    '''
+    try:
+        with open(path, 'rb') as f:
+            end = f.seek(0, 2)
+            duration, width, height = _read_headers(f, 0, end)
+    except (struct.error, IndexError) as e:
+        raise ValueError(f'Truncated atom in {path}') from e
+
+    bitrate = round(end * 8 / duration) if duration else None
+    return Mp4Metadata(duration=duration, width=width or None, height=height or None, bitrate=bitrate)
+
+
+def _read_headers(f: BinaryIO, start: int, end: int) -> Tuple[float | None, int, int]:
+    duration = None
+    width = height = 0
+
+    for atom_type, offset, size in iter_atoms(f, start, end):
+        if atom_type in CONTAINER_ATOMS:
+            child_duration, child_width, child_height = _read_headers(f, offset, offset + size)
+            duration = duration if child_duration is None else child_duration
+            if child_width * child_height > width * height:
+                width, height = child_width, child_height
+
+        elif atom_type == b'mvhd':
+            f.seek(offset)
+            version = f.read(4)[0]
+            if version == 1:
+                _, _, timescale, length = struct.unpack('>QQIQ', f.read(28))
+            else:
+                _, _, timescale, length = struct.unpack('>IIII', f.read(16))
+            duration = length / timescale if timescale else None
+
+        elif atom_type == b'tkhd':
+            # the track width and height are 16.16 fixed point numbers at the end of the header
+            f.seek(offset + size - 8)
+            track_width, track_height = struct.unpack('>II', f.read(8))
+            if (track_width >> 16) * (track_height >> 16) > width * height:
+                width, height = track_width >> 16, track_height >> 16
+
+    return duration, width, height
@@ -0,0 +1,128 @@
+import hashlib
+from pathlib import Path
+from typing import Dict, List, TypedDict
+
+from flask import Blueprint, Response, abort, jsonify, request, send_file
+
+from src.clips import DEFAULT_TENANT, get_catalog, get_clip_url
+from src.models import Clip, Format, Option, Quality, Tenant, Topic
+
+ASSETS_DIR = Path(__file__).parent / 'assets'
+
+# Prefix of the Cache Storage names used by the service worker for clip packs
+CACHE_PREFIX = 'clips:'
+
+offline = Blueprint('offline', __name__)
+
+
+class Pack(TypedDict):
+    name: str
+    cache: str
+    urls: List[str]
+    alternates: Dict[str, str]
+
+
+def build_pack(name: str, clips: List[Clip], quality: Quality) -> Pack:
+    '''
+        Lists the clip urls to save for a pack in the selected quality.
+
+        The pack is versioned by its urls, which contain the content digests, so the cache name changes whenever a
+        clip is added, removed or replaced, or the quality changes. `alternates` maps the urls of the clip's other
+        renditions to the saved one, so the clip can still be played offline after the quality is changed.
+    '''
+    if quality == Quality.AUTO:
+        quality = Quality.for_throughput(None)
+
+    urls = []
+    alternates = {}
+    for clip in clips:
+        url = get_clip_url(clip, quality)
+        # clips with the same content have the same url, see `src.clips.file_url`
+        if url not in urls:
+            urls.append(url)
+        alternates.update({other: url for other in [clip.url, *clip.renditions.values()] if other != url})
+
+    version = hashlib.sha256('\n'.join(urls).encode()).hexdigest()[:12]
+    return Pack(name=name, cache=f'{CACHE_PREFIX}{name}:{version}', urls=urls, alternates=alternates)
+
+
+def pack_name(tenant: Tenant, name: str) -> str:
+    '''
+        Names a pack of a tenant other than the default like `{rule set}/{language}/{pack}`, see `src/assets/offline.js`
+    '''
+    return name if tenant == DEFAULT_TENANT else f'{tenant}/{name}'
+
+
+def pack_names(format: Format, topics: List[Topic], options: List[Option]) -> List[str]:
+    formats = [Format.RECEPTIVE, Format.EXPRESSIVE] if format == Format.BOTH else [format]
+    names = [f'{f}/{topic}' for f in formats for topic in topics]
+    if Option.INTRO in options:
+        names.extend(f'{f}/intro' for f in formats)
+    if Option.OUTRO in options:
+        names.append('outro')
+    return names
+
+
+@offline.route('/sw.js')
+def serve_service_worker() -> Response:
+    '''
+        Serves the service worker from the site root, so that it can control the whole app.
+
+        It is kept out of the Dash assets that are added to the page, see `assets_ignore` in `src.app`.
+    '''
+    response = send_file(ASSETS_DIR / 'sw.js', mimetype='text/javascript', max_age=0)
+    # browsers check for a new service worker on every visit
+    response.cache_control.no_cache = True
+    return response
+
+
+@offline.route('/offline/packs.json')
+def serve_packs() -> Response:
+    '''
+        Lists the packs to save for the selected `tenant`, `format`, `topics`, `options` and `quality`
+    '''
+    try:
+        tenant = Tenant.parse(request.args.get('tenant', str(DEFAULT_TENANT)))
+        format = Format(request.args.get('format', Format.get_default_option()))
+        topics = [Topic(t) for t in request.args.get('topics', '').split(',') if t]
+        options = [Option(o) for o in request.args.get('options', '').split(',') if o]
+        quality = Quality(request.args.get('quality', Quality.get_default_option()))
+        packs = get_catalog(tenant).get_packs()
+    except ValueError:
+        abort(400)
+
+    return jsonify([
+        build_pack(pack_name(tenant, name), packs[name], quality)
+        for name in pack_names(format, topics, options)
+        if name in packs
+    ])
+
+
+@offline.route('/offline/caches.json')
+def serve_cache_names() -> Response:
+    '''
+        Lists the cache names of every current pack in every quality, of the default tenant and the `tenants` that
+        have packs saved in the browser. The service worker deletes the other packs.
+    '''
+    tenants = {DEFAULT_TENANT}
+    for value in request.args.get('tenants', '').split(','):
+        try:
+            tenants.add(Tenant.parse(value))
+        except ValueError:
+            pass
+
+    names = []
+    for tenant in tenants:
+        try:
+            packs = get_catalog(tenant).get_packs()
+        except ValueError:
+            # the tenant's clip library has been removed, so its saved packs are deleted
+            continue
+        names.extend(
+            build_pack(pack_name(tenant, name), clips, quality)['cache']
+            for name, clips in packs.items()
+            for quality in Quality
+        )
+    response = jsonify(sorted(set(names)))
+    response.cache_control.no_cache = True
+    return response
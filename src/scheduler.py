@@ -0,0 +1,106 @@
+import heapq
+import random
+import time
+from typing import Dict, List, Tuple
+
+from src.models import Clip, Format, Tenant, Topic
+
+DAY = 24 * 60 * 60
+
+# Leitner boxes: a clip answered correctly moves up a box and is next due after that box's interval,
+# a clip answered incorrectly goes back to the first box and is due again straight away
+INTERVALS = [0, 1 * DAY, 3 * DAY, 7 * DAY, 16 * DAY, 35 * DAY]
+
+# Progress is kept in the browser, as compact `[box, due, last_seen]` lists keyed by `Clip.key`
+Card = Tuple[int, float, float]
+Progress = Dict[str, Card]
+
+# A clip answered incorrectly comes back this many clips later in the same session, see `requeue`
+RELEARN_AFTER = 3
+
+# The clips still to play in a spaced repetition session, kept in the session as a heap of
+# `[group, position, clip id]` entries. Each format of the playlist is a group, so clips stay with their intro.
+QueueEntry = List[float]
+Queue = List[QueueEntry]
+
+
+def clip_key(format: Format | None, topic: Topic | None, name: str, tenant: Tenant | None = None) -> str:
+    '''
+        Identifies a clip across catalog rebuilds and transcodes. Keys of tenants other than the default start with the
+        tenant, since other rule sets and languages have clips with the same names.
+    '''
+    key = f'{format}/{topic}/{name}'
+    return key if tenant is None or tenant == Tenant.get_default_option() else f'{tenant}/{key}'
+
+
+def review(progress: Progress | None, clip: Clip, correct: bool, now: float | None = None) -> Progress:
+    '''
+        Records a self-reported answer for a clip, returning the updated progress
+    '''
+    now = time.time() if now is None else now
+    progress = dict(progress or {})
+
+    box = progress.get(clip.key, (0, 0, 0))[0]
+    box = min(box + 1, len(INTERVALS) - 1) if correct else 0
+    progress[clip.key] = (box, now + INTERVALS[box], now)
+
+    return progress
+
+
+def schedule(
+    clips: List[Clip],
+    progress: Progress | None,
+    now: float | None = None,
+    rng: random.Random | None = None
+) -> List[Clip]:
+    '''
+        Orders clips for practice: clips that are due come first, lowest box first, then the ones seen longest ago.
+        Clips that have never been answered count as due, in random order. Clips that are not due yet follow,
+        soonest due first.
+    '''
+    now = time.time() if now is None else now
+    progress = progress or {}
+    rng = rng or random.Random()
+
+    def key(clip: Clip) -> Tuple[int, float, float, float]:
+        box, due, seen = progress.get(clip.key, (0, 0, 0))
+        return (0, box, seen, rng.random()) if due <= now else (1, due, seen, rng.random())
+
+    return sorted(clips, key=key)
+
+
+def queue_playlist(playlist: List[Clip]) -> Queue:
+    '''
+        Queues a playlist ordered by `schedule`, so that its clips are popped in order with `pop_queued`
+    '''
+    queue = []
+    group = 0
+    for position, clip in enumerate(playlist):
+        if position and clip.format != playlist[position - 1].format:
+            group += 1
+        queue.append([group, position, clip.id])
+    # the entries are in order, which is already a heap
+    return queue
+
+
+def pop_queued(queue: Queue) -> QueueEntry | None:
+    '''
+        Takes the next clip to play off the queue, in O(log n), or returns None when the queue is empty
+    '''
+    return heapq.heappop(queue) if queue else None
+
+
+def peek_queued(queue: Queue, count: int) -> List[int]:
+    '''
+        Gets the ids of the next `count` clips on the queue, without taking them off
+    '''
+    return [entry[-1] for entry in heapq.nsmallest(count, queue)]
+
+
+def requeue(queue: Queue, entry: QueueEntry) -> None:
+    '''
+        Brings a clip that was just answered incorrectly back `RELEARN_AFTER` clips later, among the clips of its
+        format
+    '''
+    group, position, id = entry
+    heapq.heappush(queue, [group, position + RELEARN_AFTER + 0.5, id])
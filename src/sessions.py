@@ -0,0 +1,153 @@
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from functools import cache
+from pathlib import Path
+from typing import Any, Tuple
+
+DEFAULT_TTL = 4 * 60 * 60
+
+
+class SessionStore(ABC):
+    '''
+        Holds practice session data on the server, so the browser only needs to keep the session token
+
+        Args:
+            ttl (float): Seconds after the last write before a session expires
+    '''
+
+    def __init__(self, ttl: float = DEFAULT_TTL):
+        self.ttl = ttl
+
+    @staticmethod
+    def new_token() -> str:
+        return secrets.token_urlsafe(16)
+
+    def create(self, data: Any) -> str:
+        '''
+            Stores `data` in a new session and returns its token
+        '''
+        token = self.new_token()
+        self.set(token, data)
+        return token
+
+    @abstractmethod
+    def get(self, token: str) -> Any | None:
+        '''
+            Returns the session data, or None when the session does not exist or has expired
+        '''
+
+    @abstractmethod
+    def set(self, token: str, data: Any) -> None:
+        pass
+
+    @abstractmethod
+    def delete(self, token: str) -> None:
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    '''
+        Keeps sessions in process memory, evicting the least recently used once `max_size` is reached.
+
+        Sessions are not shared between gunicorn workers, so use `SqliteSessionStore` when running more than one.
+
+        Args:
+            max_size (int): The maximum number of sessions to keep
+            ttl (float): Seconds after the last write before a session expires
+    '''
+
+    def __init__(self, max_size: int = 1000, ttl: float = DEFAULT_TTL):
+        super().__init__(ttl)
+        self.max_size = max_size
+        self._sessions: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Any | None:
+        with self._lock:
+            item = self._sessions.get(token)
+            if item is None:
+                return None
+            expires, data = item
+            if expires < time.monotonic():
+                del self._sessions[token]
+                return None
+            self._sessions.move_to_end(token)
+            return data
+
+    def set(self, token: str, data: Any) -> None:
+        with self._lock:
+            self._sessions[token] = (time.monotonic() + self.ttl, data)
+            self._sessions.move_to_end(token)
+            while len(self._sessions) > self.max_size:
+                self._sessions.popitem(last=False)
+
+    def delete(self, token: str) -> None:
+        with self._lock:
+            self._sessions.pop(token, None)
+
+
+class SqliteSessionStore(SessionStore):
+    '''
+        Keeps sessions in a sqlite database, so that all workers on a host share them.
+
+        Args:
+            path (Path): The database file
+            ttl (float): Seconds after the last write before a session expires
+    '''
+
+    def __init__(self, path: Path, ttl: float = DEFAULT_TTL):
+        super().__init__(ttl)
+        self.path = path
+        with self._connect() as db:
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('CREATE TABLE IF NOT EXISTS sessions (token TEXT PRIMARY KEY, expires REAL, data TEXT)')
+
+    def _connect(self) -> sqlite3.Connection:
+        # a connection per call keeps this safe across threads and forked workers
+        return sqlite3.connect(self.path, timeout=5)
+
+    def get(self, token: str) -> Any | None:
+        with self._connect() as db:
+            row = db.execute(
+                'SELECT data FROM sessions WHERE token = ? AND expires >= ?', (token, time.time())
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, token: str, data: Any) -> None:
+        now = time.time()
+        with self._connect() as db:
+            db.execute('DELETE FROM sessions WHERE expires < ?', (now,))
+            db.execute(
+                'INSERT OR REPLACE INTO sessions (token, expires, data) VALUES (?, ?, ?)',
+                (token, now + self.ttl, json.dumps(data, separators=(',', ':')))
+            )
+
+    def delete(self, token: str) -> None:
+        with self._connect() as db:
+            db.execute('DELETE FROM sessions WHERE token = ?', (token,))
+
+
+@cache
+def get_store() -> SessionStore:
+    '''
+        Gets the session store configured by the environment, creating it on first use.
+
+        `PLAYLIST_SESSION_BACKEND` is `memory` (the default) or `sqlite`, with the database at `PLAYLIST_SESSION_PATH`.
+        `PLAYLIST_SESSION_TTL` sets the expiry in seconds, and `PLAYLIST_SESSION_MAX` the size of the memory store.
+    '''
+    ttl = float(os.getenv('PLAYLIST_SESSION_TTL', DEFAULT_TTL))
+    backend = os.getenv('PLAYLIST_SESSION_BACKEND', 'memory')
+
+    if backend == 'memory':
+        return MemorySessionStore(max_size=int(os.getenv('PLAYLIST_SESSION_MAX', 1000)), ttl=ttl)
+    elif backend == 'sqlite':
+        return SqliteSessionStore(Path(os.getenv('PLAYLIST_SESSION_PATH', 'sessions.sqlite3')), ttl=ttl)
+    else:
+        raise ValueError(f'Unknown PLAYLIST_SESSION_BACKEND {backend!r}')
+
@@ -0,0 +1,156 @@
+'''
+    Produces the low/medium/high renditions, a poster frame and HLS segments for every clip of every tenant, using a
+    local ffmpeg binary.
+
+    Usage: `python -m src.transcode [--force] [--jobs N]`
+
+    Output is written to `src/renditions/{digest}/`, keyed by the content digest of the source clip, so only new or
+    changed clips are transcoded. The manifest is rebuilt afterwards so that workers pick up the new renditions.
+'''
+import argparse
+import os
+import shutil
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+from src import manifest
+from src.manifest import SRC_DIR, ManifestEntry, hls_path, poster_path, rendition_path
+from src.models import Quality
+
+
+class Rendition(NamedTuple):
+    height: int
+    video_kbps: int
+    audio_kbps: int
+
+
+RENDITIONS: Dict[Quality, Rendition] = {
+    Quality.LOW: Rendition(height=360, video_kbps=400, audio_kbps=64),
+    Quality.MEDIUM: Rendition(height=540, video_kbps=900, audio_kbps=96),
+    Quality.HIGH: Rendition(height=720, video_kbps=1800, audio_kbps=128),
+}
+
+POSTER_HEIGHT = 360
+
+# Continuous sessions join the segments of many clips, so every clip is segmented with the same encoding settings
+HLS_RENDITION = RENDITIONS[Quality.MEDIUM]
+
+HLS_SEGMENT_SECONDS = 2
+
+
+def get_ffmpeg() -> str:
+    '''
+        Finds the ffmpeg binary, from `FFMPEG` or the PATH
+    '''
+    ffmpeg = os.getenv('FFMPEG') or shutil.which('ffmpeg')
+    if not ffmpeg:
+        raise SystemExit('ffmpeg was not found, install it or set FFMPEG to its path')
+    return ffmpeg
+
+
+def rendition_command(ffmpeg: str, source: Path, target: Path, rendition: Rendition) -> List[str]:
+    return [
+        ffmpeg, '-y', '-loglevel', 'error',
+        '-i', str(source),
+        # scale down to the rendition height, but never up
+        '-vf', f"scale=-2:'min({rendition.height},ih)'",
+        '-c:v', 'libx264', '-preset', 'slow', '-profile:v', 'main',
+        '-b:v', f'{rendition.video_kbps}k',
+        '-maxrate', f'{rendition.video_kbps * 3 // 2}k',
+        '-bufsize', f'{rendition.video_kbps * 2}k',
+        '-c:a', 'aac', '-b:a', f'{rendition.audio_kbps}k',
+        '-movflags', '+faststart',
+        '-f', 'mp4', str(target),
+    ]
+
+
+def poster_command(ffmpeg: str, source: Path, target: Path) -> List[str]:
+    return [
+        ffmpeg, '-y', '-loglevel', 'error',
+        '-ss', '1', '-i', str(source),
+        '-frames:v', '1',
+        '-vf', f"scale=-2:'min({POSTER_HEIGHT},ih)'",
+        '-f', 'image2', str(target),
+    ]
+
+
+def hls_command(ffmpeg: str, source: Path, target: Path) -> List[str]:
+    return [
+        ffmpeg, '-y', '-loglevel', 'error',
+        '-i', str(source),
+        '-vf', f"scale=-2:'min({HLS_RENDITION.height},ih)'",
+        '-c:v', 'libx264', '-preset', 'slow', '-profile:v', 'main',
+        '-b:v', f'{HLS_RENDITION.video_kbps}k',
+        '-force_key_frames', f'expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})',
+        '-c:a', 'aac', '-b:a', f'{HLS_RENDITION.audio_kbps}k', '-ar', '44100', '-ac', '2',
+        '-f', 'hls',
+        '-hls_time', str(HLS_SEGMENT_SECONDS),
+        '-hls_playlist_type', 'vod',
+        '-hls_segment_filename', str(target.parent / 'segment%03d.ts'),
+        str(target),
+    ]
+
+
+def run(command: List[str], target: Path) -> None:
+    '''
+        Runs an ffmpeg command that writes to a temporary file, then moves it into place
+    '''
+    tmp = target.with_name(f'.{target.name}')
+    command = [*command[:-1], str(tmp)]
+    subprocess.run(command, check=True)
+    os.replace(tmp, target)
+
+
+def transcode(ffmpeg: str, entry: ManifestEntry, force: bool) -> int:
+    '''
+        Produces any missing renditions, poster and HLS segments for a clip, returning the number of files written
+    '''
+    source = SRC_DIR / entry['path']
+    written = 0
+
+    rendition_path(entry['digest'], Quality.LOW).parent.mkdir(parents=True, exist_ok=True)
+
+    for quality, rendition in RENDITIONS.items():
+        target = rendition_path(entry['digest'], quality)
+        if force or not target.is_file():
+            run(rendition_command(ffmpeg, source, target, rendition), target)
+            written += 1
+
+    target = poster_path(entry['digest'])
+    if force or not target.is_file():
+        run(poster_command(ffmpeg, source, target), target)
+        written += 1
+
+    target = hls_path(entry['digest'])
+    if force or not target.is_file():
+        target.parent.mkdir(exist_ok=True)
+        run(hls_command(ffmpeg, source, target), target)
+        written += 1
+
+    return written
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Transcode clip renditions and posters')
+    parser.add_argument('--force', action='store_true', help='transcode clips that already have renditions')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='number of concurrent ffmpeg processes')
+    args = parser.parse_args()
+
+    ffmpeg = get_ffmpeg()
+    libraries = {tenant: manifest.load_tenant(tenant) for tenant in manifest.list_tenants()}
+
+    # renditions are keyed by digest, so clips with the same content in several tenants are transcoded once
+    clips = {e['digest']: e for current in libraries.values() for e in current['clips']}
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as pool:
+        written = sum(pool.map(lambda e: transcode(ffmpeg, e, args.force), clips.values()))
+
+    for tenant, current in libraries.items():
+        manifest.write(manifest.scan(current, manifest.tenant_dir(tenant)), manifest.tenant_manifest_path(tenant))
+    print(f'Wrote {written} files for {len(clips)} clips')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,233 @@
+'''
+    Checks the clip library of every tenant for problems before it is deployed: files outside a valid `Format`/`Topic`
+    folder, files that are empty, truncated or not mp4s, clips with the same content, and clips that only exist in one
+    format.
+
+    Usage: `python -m src.validate [--jobs N] [--strict] [--json report.json]`
+
+    Files are checked in parallel by a process pool. Only the mp4 headers are read, and files whose size and mtime
+    match the manifest reuse its digest, so only new or changed files are hashed. Exits with status 1 when there are
+    errors, or warnings with `--strict`.
+'''
+import argparse
+import json
+import os
+import struct
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from enum import StrEnum
+from pathlib import Path
+from typing import Dict, List, NamedTuple, TypedDict
+
+from src import manifest
+from src.manifest import SRC_DIR, FileEntry, classify, file_entry
+from src.models import Format, Tenant
+from src.mp4 import iter_atoms, read_metadata
+
+# Top level atoms every playable mp4 has
+REQUIRED_ATOMS = (b'ftyp', b'moov', b'mdat')
+
+
+class Severity(StrEnum):
+    ERROR = 'error'
+    WARNING = 'warning'
+
+
+class Issue(TypedDict):
+    path: str
+    severity: Severity
+    problem: str
+
+
+class FileCheck(NamedTuple):
+    entry: FileEntry
+    format: Format | None
+    hashed: bool
+    issues: List[Issue]
+
+
+class Report(TypedDict):
+    files: int
+    hashed: int
+    seconds: float
+    errors: int
+    warnings: int
+    issues: List[Issue]
+
+
+def check_atoms(path: Path) -> List[str]:
+    '''
+        Walks the top level atoms of an mp4 file, returning the problems found: missing atoms, or an atom that runs
+        past the end of the file, which is how an interrupted upload usually looks
+    '''
+    found = set()
+    with open(path, 'rb') as f:
+        end = f.seek(0, 2)
+        try:
+            for atom_type, offset, size in iter_atoms(f, 0, end):
+                if not found and atom_type != b'ftyp':
+                    return ['Does not start with an ftyp atom, so it is not an mp4 file']
+                found.add(atom_type)
+                if offset + size > end:
+                    return [f"Truncated: the {atom_type.decode('latin-1')} atom ends after the end of the file"]
+        except (struct.error, ValueError) as e:
+            return [f'Corrupt atoms: {e}']
+
+    return [f'Missing the {atom.decode()} atom' for atom in REQUIRED_ATOMS if atom not in found]
+
+
+def check_file(path: Path, previous: FileEntry | None) -> FileCheck:
+    '''
+        Checks a single file. Runs in the process pool, so it only takes and returns picklable values.
+    '''
+    entry = file_entry(path, previous)
+    issues = []
+
+    def report(severity: Severity, problem: str) -> None:
+        issues.append(Issue(path=entry['path'], severity=severity, problem=problem))
+
+    format = None
+    try:
+        format, _ = classify(path)
+    except ValueError:
+        report(Severity.ERROR, 'Not in a {Format}/{Topic} folder, so it is left out of the library')
+
+    if path.suffix != '.mp4':
+        report(Severity.ERROR, 'Not an .mp4 file')
+    elif entry['size'] == 0:
+        report(Severity.ERROR, 'Empty file')
+    else:
+        problems = check_atoms(path)
+        for problem in problems:
+            report(Severity.ERROR, problem)
+        if not problems:
+            try:
+                metadata = read_metadata(path)
+                if metadata.duration is None:
+                    report(Severity.ERROR, 'No duration in the movie header')
+                if metadata.width is None:
+                    report(Severity.WARNING, 'No video track')
+            except ValueError as e:
+                report(Severity.ERROR, str(e))
+
+    # `file_entry` only hashes the file when its size or mtime differ from the previous entry
+    hashed = not previous or (previous['size'], previous['mtime']) != (entry['size'], entry['mtime'])
+    return FileCheck(entry=entry, format=format, hashed=hashed, issues=issues)
+
+
+def find_duplicates(checks: List[FileCheck]) -> List[Issue]:
+    '''
+        Reports files with the same content as another file of the same library. They are warnings, since clips are
+        addressed by their digest and each content is stored and served once whatever its paths, see `src.blobs`.
+        Other tenants often have the same clips too.
+    '''
+    by_digest: Dict[str, List[str]] = defaultdict(list)
+    for check in checks:
+        if check.entry['size']:
+            by_digest[check.entry['digest']].append(check.entry['path'])
+
+    return [
+        Issue(path=path, severity=Severity.WARNING, problem=f'Same content as {paths[0]}')
+        for paths in by_digest.values()
+        for path in paths[1:]
+    ]
+
+
+def find_unpaired(checks: List[FileCheck], root: Path) -> List[Issue]:
+    '''
+        Reports clips that exist in one format but not the other, matched by their path inside the format folder
+    '''
+    names: Dict[Format, Dict[str, str]] = {Format.RECEPTIVE: {}, Format.EXPRESSIVE: {}}
+    for check in checks:
+        if check.format in names:
+            path = SRC_DIR / check.entry['path']
+            names[check.format][path.relative_to(root / check.format).as_posix()] = check.entry['path']
+
+    issues = []
+    for format, other in [(Format.RECEPTIVE, Format.EXPRESSIVE), (Format.EXPRESSIVE, Format.RECEPTIVE)]:
+        for name in sorted(names[format].keys() - names[other].keys()):
+            issues.append(Issue(
+                path=names[format][name],
+                severity=Severity.WARNING,
+                problem=f'No {other} clip at {(root / other / name).relative_to(SRC_DIR).as_posix()}',
+            ))
+    return issues
+
+
+def list_files(root: Path) -> List[Path]:
+    return sorted(Path(directory) / name for directory, _, names in os.walk(root) for name in names)
+
+
+def validate(tenants: List[Tenant], jobs: int) -> Report:
+    '''
+        Checks every file in the clip libraries of the `tenants`, reusing digests from their manifests
+    '''
+    start = time.perf_counter()
+
+    roots = []
+    paths = []
+    known_entries = []
+    for tenant in tenants:
+        previous = manifest.read_previous(manifest.tenant_manifest_path(tenant))
+        known = {e['path']: e for e in previous['clips']} if previous else {}
+        files = list_files(manifest.tenant_dir(tenant))
+        roots.append((manifest.tenant_dir(tenant), len(files)))
+        paths.extend(files)
+        known_entries.extend(known.get(p.relative_to(SRC_DIR).as_posix()) for p in files)
+
+    # one pool for every library, so that many small libraries still keep every process busy
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        chunksize = max(1, len(paths) // (jobs * 4))
+        checks = list(pool.map(check_file, paths, known_entries, chunksize=chunksize))
+
+    issues = [issue for check in checks for issue in check.issues]
+    offset = 0
+    for root, count in roots:
+        library = checks[offset:offset + count]
+        issues.extend(find_duplicates(library))
+        issues.extend(find_unpaired(library, root))
+        offset += count
+    issues.sort(key=lambda issue: (issue['severity'] != Severity.ERROR, issue['path']))
+
+    return Report(
+        files=len(checks),
+        hashed=sum(check.hashed for check in checks),
+        seconds=time.perf_counter() - start,
+        errors=sum(issue['severity'] == Severity.ERROR for issue in issues),
+        warnings=sum(issue['severity'] == Severity.WARNING for issue in issues),
+        issues=issues,
+    )
+
+
+def print_report(report: Report) -> None:
+    for issue in report['issues']:
+        print(f"{issue['severity']:<7}  {issue['path']}: {issue['problem']}")
+    if report['issues']:
+        print()
+    print(
+        f"Checked {report['files']} files ({report['hashed']} hashed) in {report['seconds']:.2f}s: "
+        f"{report['errors']} errors, {report['warnings']} warnings"
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Check the clip library for problems')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='number of processes checking files')
+    parser.add_argument('--strict', action='store_true', help='fail on warnings as well as errors')
+    parser.add_argument('--json', metavar='PATH', help='also write the report as json')
+    args = parser.parse_args()
+
+    report = validate(manifest.list_tenants(), args.jobs)
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if report['errors'] or (args.strict and report['warnings']):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
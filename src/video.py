@@ -0,0 +1,109 @@
+from pathlib import PurePosixPath
+
+from flask import Blueprint, Response, abort, request, send_file
+
+from src.blobs import get_blob
+from src.clips import get_catalog, get_session_catalog
+from src.hls import session_playlist
+from src.manifest import SRC_DIR, FileEntry, matches
+from src.models import PlaylistSession, Tenant
+from src.sessions import get_store
+
+# Clip urls contain the content digest, so a url always refers to the same bytes and can be cached forever
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Types that python's mimetypes module does not know, or guesses wrongly
+MIMETYPES = {
+    '.ts': 'video/mp2t',
+}
+
+video = Blueprint('video', __name__, url_prefix='/video')
+
+
+def send_content(entry: FileEntry) -> Response:
+    '''
+        Serves a clip, rendition, poster or HLS segment file, from its blob when it has been stored, see `src.blobs`.
+
+        `send_file` answers Range requests with 206 partial content, and If-None-Match/If-Modified-Since with
+        304 not modified. Whole-file responses go through the server's `wsgi.file_wrapper`, which lets gunicorn use
+        sendfile.
+
+        A file that has been overwritten since the catalog was loaded is not served, since its url and ETag name the
+        old content, which browsers and CDNs cache forever.
+    '''
+    path = get_blob(entry)
+    if path is None:
+        path = SRC_DIR / entry['path']
+        if not matches(path, entry):
+            abort(404)
+
+    response = send_file(
+        path,
+        mimetype=MIMETYPES.get(PurePosixPath(entry['path']).suffix),
+        conditional=True,
+        etag=entry['digest'],
+        last_modified=entry['mtime'] / 1e9,
+        max_age=IMMUTABLE_MAX_AGE,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def find_file(digest: str) -> FileEntry | None:
+    '''
+        Finds a file by its content digest in the default catalog, or in the catalog of the `tenant` in the query
+    '''
+    entry = get_catalog().get_file(digest)
+    if entry is None and request.args.get('tenant'):
+        try:
+            entry = get_catalog(Tenant.parse(request.args['tenant'])).get_file(digest)
+        except ValueError:
+            abort(404)
+    return entry
+
+
+@video.route('/<digest>.<extension>')
+def serve_clip(digest: str, extension: str) -> Response:
+    '''
+        Serves a file by its content digest, see `src.clips.file_url`
+    '''
+    entry = find_file(digest)
+    if entry is None or PurePosixPath(entry['path']).suffix != f'.{extension}':
+        abort(404)
+    return send_content(entry)
+
+
+@video.route('/<digest>/<name>')
+def serve_named_clip(digest: str, name: str) -> Response:
+    '''
+        Serves the urls that also had the file name, for pages and saved packs from before urls were digests only
+    '''
+    entry = find_file(digest)
+    if entry is None or PurePosixPath(entry['path']).suffix != PurePosixPath(name).suffix:
+        abort(404)
+    return send_content(entry)
+
+
+def get_continuous_session(token: str) -> PlaylistSession:
+    session: PlaylistSession | None = get_store().get(token)
+    if session is None or not session['continuous']:
+        abort(404)
+    return session
+
+
+@video.route('/session/<token>.m3u8')
+def serve_session_playlist(token: str) -> Response:
+    '''
+        Serves a continuous practice session as a single HLS playlist over the segments of its clips
+    '''
+    session = get_continuous_session(token)
+    catalog = get_session_catalog(session)
+    if catalog is None:
+        abort(404)
+    playlist = catalog.get_clips(session['playlist'])
+    response = Response(session_playlist(playlist), mimetype='application/vnd.apple.mpegurl')
+    response.cache_control.private = True
+    response.cache_control.max_age = int(get_store().ttl)
+    return response
+
@@ -0,0 +1,222 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterator, Set, Tuple
+
+from src import manifest
+from src.clips import get_catalog, set_catalog
+from src.manifest import SRC_DIR, STATIC_DIR
+
+logger = logging.getLogger(__name__)
+
+# inotify event masks, from <sys/inotify.h>
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_Q_OVERFLOW = 0x4000
+IN_ISDIR = 0x40000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class CatalogWatcher(threading.Thread):
+    '''
+        Watches the static directory and applies added, removed and changed clips to the catalog as they happen.
+
+        Only the directories with changes are rescanned, and the new catalog is swapped in atomically, so requests in
+        flight keep using the catalog they started with. The changes are written to the manifest, which numbers new
+        clips, so that every worker gives a clip the same id. Uses inotify on Linux, and otherwise polls the size and mtime
+        of every file every `interval` seconds.
+
+        Args:
+            interval (float): Seconds between polls, and the time to wait for a burst of changes to settle
+    '''
+
+    def __init__(self, interval: float = 2.0):
+        super().__init__(name='catalog-watcher', daemon=True)
+        self.interval = interval
+        self._stop = threading.Event()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def run(self) -> None:
+        try:
+            changes = self.inotify_changes() if sys.platform == 'linux' else self.polled_changes()
+        except OSError:
+            logger.warning('inotify is not available, polling the clip library for changes instead')
+            changes = self.polled_changes()
+
+        for directories in changes:
+            try:
+                self.refresh(directories)
+            except Exception:
+                logger.exception('Failed to refresh the clip catalog')
+
+    def refresh(self, directories: Set[Path]) -> None:
+        '''
+            Rescans the changed directories and swaps in a catalog with their clips replaced. The clips of a directory
+            that no longer exists are removed along with those of its subdirectories, since a folder that is moved or
+            deleted as a whole has no events for the folders inside it.
+        '''
+        catalog = get_catalog()
+        entries = catalog.entries()
+
+        removed = set()
+        upserted = []
+        for directory in directories:
+            prefix = directory.relative_to(SRC_DIR).as_posix() + '/'
+            if not directory.is_dir():
+                removed.update(e['path'] for e in entries if e['path'].startswith(prefix))
+                continue
+
+            known = {e['path']: e for e in entries if e['path'].rsplit('/', 1)[0] + '/' == prefix}
+            scanned = manifest.scan_directory(directory, known)
+
+            removed.update(set(known) - {e['path'] for e in scanned})
+            upserted.extend(e for e in scanned if known.get(e['path']) != e)
+
+        if removed or upserted:
+            try:
+                manifest.update(directories, removed, upserted)
+            except OSError:
+                # the new clips are numbered by `updated` instead, which other workers may do differently
+                logger.warning('Failed to update the clip manifest', exc_info=True)
+            set_catalog(catalog.updated(removed, upserted))
+            logger.info('Clip catalog refreshed: %d added or changed, %d removed', len(upserted), len(removed))
+
+    @staticmethod
+    def all_directories() -> Set[Path]:
+        '''
+            Gets every directory of the library, and those of the catalog that no longer exist, to rescan it all
+        '''
+        directories = {Path(root) for root, _, _ in os.walk(STATIC_DIR)}
+        directories.update((SRC_DIR / e['path']).parent for e in get_catalog().entries())
+        return directories
+
+    def polled_changes(self) -> Iterator[Set[Path]]:
+        '''
+            Yields the directories with files added, removed, renamed or overwritten since the last poll, found by
+            comparing the size and mtime of every file. Only the files are stat'ed, not read, so a poll of a few
+            thousand clips takes milliseconds.
+        '''
+        def stats() -> Dict[Path, Tuple[Tuple[str, int, int], ...]]:
+            current = {}
+            for root, _, names in os.walk(STATIC_DIR):
+                files = []
+                for name in sorted(names):
+                    try:
+                        stat = os.stat(os.path.join(root, name))
+                    except FileNotFoundError:
+                        continue
+                    files.append((name, stat.st_size, stat.st_mtime_ns))
+                current[Path(root)] = tuple(files)
+            return current
+
+        previous = stats()
+        while not self._stop.wait(self.interval):
+            current = stats()
+            changed = {d for d in current.keys() | previous.keys() if current.get(d) != previous.get(d)}
+            previous = current
+            if changed:
+                yield changed
+
+    def inotify_changes(self) -> Iterator[Set[Path]]:
+        '''
+            Yields the directories with inotify events, batched until no events arrive for `interval` seconds.
+
+            Raises OSError straight away when inotify is not available.
+        '''
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+
+        return self._read_inotify(libc, fd)
+
+    def _read_inotify(self, libc: ctypes.CDLL, fd: int) -> Iterator[Set[Path]]:
+        watches: Dict[int, Path] = {}
+
+        def watch(directory: Path) -> None:
+            for root, _, _ in os.walk(directory):
+                wd = libc.inotify_add_watch(fd, os.fsencode(root), WATCH_MASK)
+                if wd >= 0:
+                    watches[wd] = Path(root)
+
+        try:
+            watch(STATIC_DIR)
+            changed: Set[Path] = set()
+            last_event = 0.0
+
+            while not self._stop.is_set():
+                try:
+                    data = os.read(fd, 64 * 1024)
+                except BlockingIOError:
+                    data = b''
+
+                offset = 0
+                while offset < len(data):
+                    wd, mask, _, length = EVENT_HEADER.unpack_from(data, offset)
+                    name = data[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0')
+                    offset += EVENT_HEADER.size + length
+
+                    if mask & IN_Q_OVERFLOW:
+                        # events were dropped, which happens when many clips are published at once
+                        logger.warning('inotify queue overflowed, rescanning the whole clip library')
+                        watch(STATIC_DIR)
+                        changed.update(self.all_directories())
+                        last_event = time.monotonic()
+                        continue
+
+                    directory = watches.get(wd)
+                    if directory is None:
+                        continue
+                    if mask & IN_DELETE_SELF:
+                        watches.pop(wd)
+                    elif mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO):
+                        watch(directory / os.fsdecode(name))
+                        changed.add(directory / os.fsdecode(name))
+                    elif mask & IN_ISDIR and mask & (IN_MOVED_FROM | IN_DELETE):
+                        # `refresh` removes the clips of the whole subtree
+                        changed.add(directory / os.fsdecode(name))
+                    changed.add(directory)
+                    last_event = time.monotonic()
+
+                if changed and time.monotonic() - last_event >= self.interval:
+                    yield changed
+                    changed = set()
+
+                if not data:
+                    self._stop.wait(min(self.interval, 0.25))
+        finally:
+            os.close(fd)
+
+
+def start_watcher() -> CatalogWatcher | None:
+    '''
+        Starts watching the clip library when `WATCH_CLIPS` is set.
+
+        Threads do not survive a fork, so processes forked from this one, like the workers of a preloaded gunicorn,
+        start their own watcher.
+    '''
+    if not os.getenv('WATCH_CLIPS'):
+        return None
+
+    os.register_at_fork(after_in_child=_start_watcher)
+    return _start_watcher()
+
+
+def _start_watcher() -> CatalogWatcher:
+    watcher = CatalogWatcher(interval=float(os.getenv('WATCH_CLIPS_INTERVAL', 2.0)))
+    watcher.start()
+    return watcher
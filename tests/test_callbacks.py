@@ -0,0 +1,180 @@
+import tempfile
+import unittest
+from pathlib import Path
+from typing import Dict
+from unittest import mock
+
+from src import clips, manifest
+from src.app import get_app
+from src.clips import DEFAULT_TENANT, ClipCatalog
+from src.models import Format, Length, Order, PlaylistSession, Quality, Topic
+from src.sessions import get_store
+
+
+def setUpModule():
+    # the app is built once per process, with its default manifest kept out of the source tree
+    tmp = tempfile.TemporaryDirectory()
+    unittest.addModuleCleanup(tmp.cleanup)
+    with mock.patch.object(manifest, 'MANIFEST_PATH', Path(tmp.name) / 'clip_manifest.json'):
+        get_app()
+
+
+class CallbackTest(unittest.TestCase):
+    '''
+        Runs the app's callbacks through Dash's update endpoint, over a library of three receptive pack clips
+    '''
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        src = Path(tmp.name)
+        for name in ['a', 'b', 'c']:
+            clip = src / 'static' / 'receptive' / 'pack' / f'{name}.mp4'
+            clip.parent.mkdir(parents=True, exist_ok=True)
+            clip.write_bytes(name.encode() * 100)
+
+        for target, name, value in [
+            (manifest, 'SRC_DIR', src),
+            (manifest, 'RENDITIONS_DIR', src / 'renditions'),
+            (manifest, 'TENANTS_DIR', src / 'tenants'),
+        ]:
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.catalog = ClipCatalog(manifest.scan(None, src / 'static')['clips'])
+        patcher = mock.patch.dict(clips._catalogs, {DEFAULT_TENANT: self.catalog})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        clips.get_seeded_playlist.cache_clear()
+
+        self.server = get_app().server
+        self.client = self.server.test_client()
+        self.dependencies = self.client.get('/_dash-dependencies').get_json()
+
+    def update(self, inputs: Dict, state: Dict) -> Dict[str, Dict]:
+        '''
+            Calls the server callback triggered by `inputs`, with values keyed by `{id}.{property}`, and returns the
+            updated properties by component id, empty when nothing was updated
+        '''
+        dependency = next(
+            d for d in self.dependencies
+            if not d['clientside_function'] and any(f"{i['id']}.{i['property']}" in inputs for i in d['inputs'])
+        )
+        outputs = [
+            dict(zip(['id', 'property'], spec.split('.', 1)))
+            for spec in dependency['output'].strip('.').split('...')
+        ]
+        response = self.client.post('/_dash-update-component', json=dict(
+            output=dependency['output'],
+            outputs=outputs,
+            inputs=[dict(spec, value=inputs.get(f"{spec['id']}.{spec['property']}")) for spec in dependency['inputs']],
+            state=[dict(spec, value=state.get(f"{spec['id']}.{spec['property']}")) for spec in dependency['state']],
+            changedPropIds=list(inputs),
+        ))
+        self.assertIn(response.status_code, (200, 204))
+        return response.get_json()['response'] if response.status_code == 200 else {}
+
+    def start(self, format: Format = Format.RECEPTIVE, order: Order = Order.SHUFFLE, **state) -> Dict[str, Dict]:
+        return self.update({'start_button.n_clicks': 1}, {
+            'tenant.value': str(DEFAULT_TENANT),
+            'format.value': format,
+            'topics.value': Topic.all(),
+            'options.value': [],
+            'order.value': order,
+            'length.value': Length.FULL,
+            'quality.value': Quality.AUTO,
+            'continuous.checked': False,
+            **state,
+        })
+
+    def end(self, player_store: Dict) -> Dict[str, Dict]:
+        return self.update({
+            'player_ended.data': dict(session=player_store['session'], cursor=player_store['cursor']),
+        }, {'player_store.data': player_store})
+
+    def answer(self, player_store: Dict, correct: bool, progress: Dict | None = None) -> Dict[str, Dict]:
+        button = 'answer_correct' if correct else 'answer_missed'
+        return self.update({f'{button}.n_clicks': 1}, {
+            'player_store.data': player_store,
+            'practice_progress.data': progress,
+        })
+
+
+class StartTest(CallbackTest):
+
+    def test_starts_a_session_with_the_first_clip(self):
+        response = self.start()
+        player_store = response['player_store']['data']
+        self.assertEqual(player_store['cursor'], 0)
+        self.assertIn(response['video']['url'], [clip.url for clip in self.catalog.get_clips(
+            get_store().get(player_store['session'])['playlist'])])
+        self.assertIsNone(response['topics-wrapper']['error'])
+
+    def test_no_clips_for_the_selection_shows_an_error(self):
+        response = self.start(format=Format.EXPRESSIVE)
+        self.assertEqual(response, {'topics-wrapper': {'error': 'No clips for this selection'}})
+
+
+class SpacedRepetitionTest(CallbackTest):
+
+    def test_missed_clip_is_played_again_after_the_others(self):
+        response = self.start(order=Order.SPACED)
+        player_store = response['player_store']['data']
+        played = [response['video']['url']]
+
+        progress = self.answer(player_store, correct=False)['practice_progress']['data']
+        while True:
+            response = self.end(player_store)
+            player_store = response['player_store']['data']
+            if not response['video']['url']:
+                break
+            played.append(response['video']['url'])
+            progress = self.answer(player_store, correct=True, progress=progress)['practice_progress']['data']
+
+        self.assertEqual(len(played), 4)
+        self.assertEqual(sorted(played[:3]), sorted(clip.url for clip in self.catalog.get_clips(
+            [entry['id'] for entry in self.catalog.entries()])))
+        self.assertEqual(played[3], played[0])
+        self.assertTrue(response['app_store']['data']['finished'])
+
+
+class RemovedLibraryTest(CallbackTest):
+    '''
+        A session whose tenant's clip library has been removed ends like an expired one
+    '''
+
+    def setUp(self):
+        super().setUp()
+        self.token = get_store().create(PlaylistSession(
+            tenant='mrda/en',
+            playlist=[entry['id'] for entry in self.catalog.entries()],
+            quality=Quality.AUTO,
+            continuous=True,
+            queue=None,
+            queued=None,
+        ))
+        self.addCleanup(get_store().delete, self.token)
+        self.player_store = dict(session=self.token, cursor=0, chapters=None)
+
+    def test_next_clip_ends_the_session(self):
+        response = self.end(self.player_store)
+        self.assertIsNone(response['video']['url'])
+        self.assertIsNone(response['player_store']['data']['session'])
+        self.assertTrue(response['app_store']['data']['finished'])
+        self.assertIsNone(get_store().get(self.token))
+
+    def test_answer_is_ignored(self):
+        self.assertEqual(self.answer(self.player_store, correct=True), {})
+
+    def test_session_playlist_is_not_found(self):
+        self.assertEqual(self.client.get(f'/video/session/{self.token}.m3u8').status_code, 404)
+
+    def test_restart_starts_a_new_session(self):
+        response = self.start(**{'player_store.data': self.player_store})
+        self.assertNotEqual(response['player_store']['data']['session'], self.token)
+        self.assertIsNone(get_store().get(self.token))
+
+
+if __name__ == '__main__':
+    unittest.main()
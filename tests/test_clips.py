@@ -0,0 +1,109 @@
+import random
+import unittest
+
+from src.clips import UNKNOWN_CLIP_DURATION, ClipCatalog, fill_duration
+from src.manifest import ManifestEntry
+from src.models import Clip, Format, Option, Topic
+
+
+def make_entry(path: str, digest: str, id: int | None = None, duration: float | None = 5.0) -> ManifestEntry:
+    format, topic = path.split('/')[1:3]
+    return ManifestEntry(
+        path=path,
+        size=100,
+        mtime=0,
+        digest=digest,
+        id=id,
+        format=Format(format),
+        topic=Topic(topic),
+        duration=duration,
+        width=None,
+        height=None,
+        bitrate=None,
+        renditions={},
+        poster=None,
+        segments=[],
+    )
+
+
+def make_clip(id: int, duration: float | None) -> Clip:
+    return Clip(
+        id=id,
+        key=f'receptive/pack/{id}.mp4',
+        format=Format.RECEPTIVE,
+        topic=Topic.PACK,
+        name=f'{id}.mp4',
+        url=f'video/{id}.mp4',
+        duration=duration,
+        renditions={},
+        poster=None,
+        segments=(),
+    )
+
+
+class FillDurationTest(unittest.TestCase):
+
+    def test_skips_clips_that_do_not_fit(self):
+        clips = [make_clip(0, 4), make_clip(1, 8), make_clip(2, 3)]
+        self.assertEqual(fill_duration(clips, 10, random.Random(1)), [clips[0], clips[2]])
+
+    def test_repeats_clips_while_there_is_time_left(self):
+        clips = [make_clip(0, 2), make_clip(1, 3)]
+        playlist = fill_duration(clips, 12, random.Random(1))
+        self.assertEqual(playlist[:2], clips)
+        self.assertEqual(sum(clip.duration for clip in playlist), 12)
+        self.assertEqual(playlist[-1], clips[0])
+
+    def test_picks_one_clip_when_none_fit(self):
+        clips = [make_clip(0, 30), make_clip(1, 40)]
+        self.assertEqual(fill_duration(clips, 10, random.Random(1)), [clips[0]])
+
+    def test_clips_without_a_duration_count_as_the_default(self):
+        clips = [make_clip(0, None), make_clip(1, None)]
+        playlist = fill_duration(clips, UNKNOWN_CLIP_DURATION * 1.5, random.Random(1))
+        self.assertEqual(playlist, [clips[0]])
+
+
+class ClipCatalogUpdatedTest(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = ClipCatalog([
+            make_entry('static/receptive/pack/a.mp4', 'aa', id=0),
+            make_entry('static/receptive/pack/b.mp4', 'bb', id=4),
+            make_entry('static/receptive/jammer/c.mp4', 'cc', id=2),
+        ])
+
+    def test_removes_and_adds_clips(self):
+        updated = self.catalog.updated(
+            ['static/receptive/pack/a.mp4'],
+            [make_entry('static/receptive/pack/d.mp4', 'dd')],
+        )
+        names = [clip.name for clip in updated.get_playlist(Format.RECEPTIVE, [Topic.PACK], [], seed=1)]
+        self.assertCountEqual(names, ['b.mp4', 'd.mp4'])
+        self.assertIsNone(updated.get_clip(0))
+        self.assertIsNone(updated.get_file('aa'))
+        self.assertIsNotNone(updated.get_file('dd'))
+
+    def test_new_clips_get_ids_after_the_highest(self):
+        updated = self.catalog.updated([], [make_entry('static/receptive/pack/d.mp4', 'dd')])
+        self.assertEqual(updated.get_clip(5).name, 'd.mp4')
+
+    def test_replaced_clip_keeps_its_id(self):
+        updated = self.catalog.updated([], [make_entry('static/receptive/pack/b.mp4', 'b2', id=4)])
+        self.assertEqual(updated.get_clip(4).url, 'video/b2.mp4')
+        self.assertIsNone(updated.get_file('bb'))
+        self.assertEqual(len(updated.entries()), 3)
+
+    def test_leaves_the_original_unchanged(self):
+        self.catalog.updated(
+            ['static/receptive/pack/a.mp4'],
+            [make_entry('static/receptive/pack/d.mp4', 'dd')],
+        )
+        playlist = self.catalog.get_playlist(Format.RECEPTIVE, [Topic.PACK], [Option.INTRO], seed=1)
+        self.assertCountEqual([clip.name for clip in playlist], ['a.mp4', 'b.mp4'])
+        self.assertIsNotNone(self.catalog.get_file('aa'))
+        self.assertIsNone(self.catalog.get_file('dd'))
+
+
+if __name__ == '__main__':
+    unittest.main()
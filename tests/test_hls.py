@@ -0,0 +1,63 @@
+import unittest
+
+from src.hls import chapter_starts, session_playlist
+from src.models import Clip, Format, Segment, Topic
+
+
+def make_clip(name: str, *segments: Segment) -> Clip:
+    return Clip(
+        id=0,
+        key=f'receptive/pack/{name}',
+        format=Format.RECEPTIVE,
+        topic=Topic.PACK,
+        name=name,
+        url=f'video/{name}',
+        duration=sum(s.duration for s in segments),
+        renditions={},
+        poster=None,
+        segments=segments,
+    )
+
+
+class SessionPlaylistTest(unittest.TestCase):
+
+    def test_joins_the_segments_of_every_clip(self):
+        playlist = session_playlist([
+            make_clip('a.mp4', Segment('video/a0.ts', 4.0), Segment('video/a1.ts', 2.5)),
+            make_clip('b.mp4', Segment('video/b0.ts?tenant=mrda/en', 3.2)),
+        ])
+        self.assertEqual(playlist.splitlines(), [
+            '#EXTM3U',
+            '#EXT-X-VERSION:3',
+            '#EXT-X-PLAYLIST-TYPE:VOD',
+            '#EXT-X-TARGETDURATION:4',
+            '#EXT-X-MEDIA-SEQUENCE:0',
+            '#EXTINF:4.000,a.mp4',
+            '../a0.ts',
+            '#EXTINF:2.500,a.mp4',
+            '../a1.ts',
+            '#EXT-X-DISCONTINUITY',
+            '#EXTINF:3.200,b.mp4',
+            '../b0.ts?tenant=mrda/en',
+            '#EXT-X-ENDLIST',
+        ])
+
+    def test_target_duration_rounds_up(self):
+        playlist = session_playlist([make_clip('a.mp4', Segment('video/a0.ts', 4.2))])
+        self.assertIn('#EXT-X-TARGETDURATION:5', playlist.splitlines())
+
+
+class ChapterStartsTest(unittest.TestCase):
+
+    def test_each_clip_starts_after_the_segments_before_it(self):
+        playlist = [
+            make_clip('a.mp4', Segment('video/a0.ts', 4.0), Segment('video/a1.ts', 2.5)),
+            make_clip('b.mp4'),
+            make_clip('c.mp4', Segment('video/c0.ts', 3.0)),
+        ]
+        self.assertEqual(chapter_starts(playlist), [0.0, 6.5, 6.5])
+        self.assertEqual(chapter_starts([]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
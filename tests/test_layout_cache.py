@@ -0,0 +1,44 @@
+import unittest
+
+from flask import Flask, Response
+
+from src.layout_cache import PrerenderedLayout
+
+
+class StubApp:
+
+    def serve_layout(self) -> Response:
+        return Response(b'{"props": {"children": []}}' * 100, mimetype='application/json')
+
+
+class PrerenderedLayoutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Flask(__name__)
+        self.layout = PrerenderedLayout(StubApp())
+
+    def get(self, headers: dict) -> Response:
+        with self.server.test_request_context(headers=headers):
+            return self.layout.response()
+
+    def test_each_encoding_has_its_own_etag(self):
+        identity = self.get({})
+        gzip = self.get({'Accept-Encoding': 'gzip'})
+        self.assertEqual(gzip.content_encoding, 'gzip')
+        self.assertNotEqual(identity.get_etag(), gzip.get_etag())
+        self.assertEqual(identity.get_etag(), (self.layout.etags['identity'], False))
+
+    def test_any_encoding_etag_is_not_modified(self):
+        for etag in self.layout.etags.values():
+            response = self.get({'Accept-Encoding': 'gzip', 'If-None-Match': f'"{etag}"'})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response.get_etag(), (etag, False))
+
+    def test_other_etags_get_the_layout(self):
+        response = self.get({'If-None-Match': '"something-else"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Accept-Encoding', response.vary)
+
+
+if __name__ == '__main__':
+    unittest.main()
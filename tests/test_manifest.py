@@ -0,0 +1,64 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src import manifest
+
+
+class StalenessTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.src = Path(tmp.name)
+        self.root = self.src / 'static'
+        self.clip = self.root / 'receptive' / 'pack' / 'a.mp4'
+        self.clip.parent.mkdir(parents=True)
+        self.clip.write_bytes(b'a' * 100)
+        self.path = self.src / 'clip_manifest.json'
+
+        for name, value in [('SRC_DIR', self.src), ('RENDITIONS_DIR', self.src / 'renditions')]:
+            patcher = mock.patch.object(manifest, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        manifest.write(manifest.scan(None, self.root), self.path)
+
+    def test_unchanged_library_is_read(self):
+        current = manifest.read(self.path)
+        self.assertEqual([e['path'] for e in current['clips']], ['static/receptive/pack/a.mp4'])
+
+    def test_added_file_makes_it_stale(self):
+        (self.clip.parent / 'b.mp4').write_bytes(b'b')
+        self.assertIsNone(manifest.read(self.path))
+
+    def test_removed_folder_makes_it_stale(self):
+        self.clip.unlink()
+        self.clip.parent.rmdir()
+        self.assertIsNone(manifest.read(self.path))
+
+    def test_overwritten_file_no_longer_matches_its_entry(self):
+        entry = manifest.read(self.path)['clips'][0]
+        self.assertTrue(manifest.matches(self.clip, entry))
+
+        self.clip.write_bytes(b'c' * 101)
+        os.utime(self.clip.parent, ns=(0, manifest.read_previous(self.path)['directories']['static/receptive/pack']))
+        self.assertIsNotNone(manifest.read(self.path))
+        self.assertFalse(manifest.matches(self.clip, entry))
+
+    def test_rescan_keeps_ids_and_rehashes_changed_files(self):
+        previous = manifest.read_previous(self.path)
+        self.clip.write_bytes(b'c' * 101)
+        (self.clip.parent / 'b.mp4').write_bytes(b'b')
+
+        entries = {e['path']: e for e in manifest.scan(previous, self.root)['clips']}
+        a = entries['static/receptive/pack/a.mp4']
+        self.assertEqual(a['id'], previous['clips'][0]['id'])
+        self.assertNotEqual(a['digest'], previous['clips'][0]['digest'])
+        self.assertEqual(entries['static/receptive/pack/b.mp4']['id'], a['id'] + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
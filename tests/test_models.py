@@ -0,0 +1,26 @@
+import unittest
+
+from src.models import RuleSet, Tenant
+
+
+class TenantParseTest(unittest.TestCase):
+
+    def test_reads_rule_set_and_language(self):
+        self.assertEqual(Tenant.parse('mrda/pt-br'), Tenant(RuleSet.MRDA, 'pt-br'))
+
+    def test_round_trips_through_str(self):
+        tenant = Tenant.get_default_option()
+        self.assertEqual(Tenant.parse(str(tenant)), tenant)
+
+    def test_rejects_unknown_rule_sets(self):
+        with self.assertRaises(ValueError):
+            Tenant.parse('roller/en')
+
+    def test_rejects_invalid_languages(self):
+        for value in ['wftda', 'wftda/', 'wftda/EN', 'wftda/../en', 'wftda/en/extra']:
+            with self.subTest(value=value), self.assertRaises(ValueError):
+                Tenant.parse(value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import struct
+import tempfile
+import unittest
+from pathlib import Path
+
+from src.mp4 import read_metadata
+
+
+def atom(atom_type: bytes, payload: bytes) -> bytes:
+    return struct.pack('>I4s', 8 + len(payload), atom_type) + payload
+
+
+def mvhd(timescale: int, length: int) -> bytes:
+    return atom(b'mvhd', struct.pack('>IIIII', 0, 0, 0, timescale, length) + bytes(80))
+
+
+def tkhd(width: int, height: int) -> bytes:
+    return atom(b'tkhd', bytes(76) + struct.pack('>II', width << 16, height << 16))
+
+
+class ReadMetadataTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = Path(tmp.name) / 'clip.mp4'
+
+    def read(self, data: bytes):
+        self.path.write_bytes(data)
+        return read_metadata(self.path)
+
+    def test_reads_duration_resolution_and_bitrate(self):
+        data = atom(b'ftyp', b'isom') + atom(b'moov', mvhd(1000, 2500) + atom(b'trak', tkhd(1280, 720)))
+        data += atom(b'mdat', bytes(1000))
+        metadata = self.read(data)
+        self.assertEqual(metadata.duration, 2.5)
+        self.assertEqual((metadata.width, metadata.height), (1280, 720))
+        self.assertEqual(metadata.bitrate, round(len(data) * 8 / 2.5))
+
+    def test_picks_the_largest_track(self):
+        tracks = atom(b'trak', tkhd(0, 0)) + atom(b'trak', tkhd(640, 360)) + atom(b'trak', tkhd(320, 180))
+        metadata = self.read(atom(b'moov', mvhd(600, 600) + tracks))
+        self.assertEqual((metadata.width, metadata.height), (640, 360))
+
+    def test_missing_headers_are_none(self):
+        metadata = self.read(atom(b'ftyp', b'isom') + atom(b'mdat', bytes(10)))
+        self.assertEqual(metadata, (None, None, None, None))
+
+    def test_truncated_atoms_raise_value_error(self):
+        data = atom(b'moov', mvhd(1000, 2500))
+        with self.assertRaises(ValueError):
+            self.read(data[:20])
+
+    def test_invalid_atom_sizes_raise_value_error(self):
+        with self.assertRaises(ValueError):
+            self.read(struct.pack('>I4s', 4, b'moov') + bytes(8))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import random
+import unittest
+
+from src.models import Clip, Format, RuleSet, Tenant, Topic
+from src.scheduler import (
+    DAY, INTERVALS, RELEARN_AFTER, clip_key, peek_queued, pop_queued, queue_playlist, requeue, review, schedule
+)
+
+NOW = 1_000_000.0
+
+
+def make_clip(id: int, format: Format = Format.RECEPTIVE) -> Clip:
+    return Clip(
+        id=id,
+        key=clip_key(format, Topic.PACK, f'{id}.mp4'),
+        format=format,
+        topic=Topic.PACK,
+        name=f'{id}.mp4',
+        url=f'video/{id}.mp4',
+        duration=5.0,
+        renditions={},
+        poster=None,
+        segments=(),
+    )
+
+
+class ClipKeyTest(unittest.TestCase):
+
+    def test_default_tenant_keys_have_no_tenant(self):
+        key = clip_key(Format.RECEPTIVE, Topic.PACK, 'a.mp4', Tenant.get_default_option())
+        self.assertEqual(key, 'receptive/pack/a.mp4')
+
+    def test_other_tenant_keys_start_with_the_tenant(self):
+        key = clip_key(Format.RECEPTIVE, Topic.PACK, 'a.mp4', Tenant(RuleSet.MRDA, 'en'))
+        self.assertEqual(key, 'mrda/en/receptive/pack/a.mp4')
+
+
+class ReviewTest(unittest.TestCase):
+
+    def test_correct_answer_moves_up_a_box(self):
+        clip = make_clip(1)
+        progress = review(None, clip, correct=True, now=NOW)
+        progress = review(progress, clip, correct=True, now=NOW)
+        self.assertEqual(progress[clip.key], (2, NOW + INTERVALS[2], NOW))
+
+    def test_missed_answer_goes_back_to_the_first_box(self):
+        clip = make_clip(1)
+        progress = review({clip.key: (3, NOW, NOW - DAY)}, clip, correct=False, now=NOW)
+        self.assertEqual(progress[clip.key], (0, NOW, NOW))
+
+    def test_box_stops_at_the_last_interval(self):
+        clip = make_clip(1)
+        progress = review({clip.key: (len(INTERVALS) - 1, NOW, NOW)}, clip, correct=True, now=NOW)
+        self.assertEqual(progress[clip.key][0], len(INTERVALS) - 1)
+
+    def test_progress_is_not_changed_in_place(self):
+        clip = make_clip(1)
+        progress = {}
+        review(progress, clip, correct=True, now=NOW)
+        self.assertEqual(progress, {})
+
+
+class ScheduleTest(unittest.TestCase):
+
+    def test_due_clips_come_first_lowest_box_first(self):
+        later, low, high, soon = clips = [make_clip(i) for i in range(4)]
+        progress = {
+            later.key: (2, NOW + 2 * DAY, NOW - DAY),
+            low.key: (1, NOW - 1, NOW - DAY),
+            high.key: (3, NOW - 1, NOW - 2 * DAY),
+            soon.key: (2, NOW + DAY, NOW - DAY),
+        }
+        self.assertEqual(schedule(clips, progress, now=NOW), [low, high, soon, later])
+
+    def test_due_clips_in_the_same_box_seen_longest_ago_first(self):
+        recent, old = clips = [make_clip(i) for i in range(2)]
+        progress = {
+            recent.key: (1, NOW, NOW - DAY),
+            old.key: (1, NOW, NOW - 2 * DAY),
+        }
+        self.assertEqual(schedule(clips, progress, now=NOW), [old, recent])
+
+    def test_new_clips_are_due_in_random_order(self):
+        clips = [make_clip(i) for i in range(20)]
+        first = schedule(clips, None, now=NOW, rng=random.Random(1))
+        self.assertCountEqual(first, clips)
+        self.assertEqual(first, schedule(clips, None, now=NOW, rng=random.Random(1)))
+        self.assertNotEqual(first, schedule(clips, None, now=NOW, rng=random.Random(2)))
+
+
+class QueueTest(unittest.TestCase):
+
+    def pop_all(self, queue):
+        ids = []
+        while (entry := pop_queued(queue)) is not None:
+            ids.append(entry[-1])
+        return ids
+
+    def test_clips_are_popped_in_playlist_order(self):
+        queue = queue_playlist([make_clip(i) for i in [3, 1, 2]])
+        self.assertEqual(peek_queued(queue, 2), [3, 1])
+        self.assertEqual(self.pop_all(queue), [3, 1, 2])
+
+    def test_missed_clip_comes_back_later(self):
+        queue = queue_playlist([make_clip(i) for i in range(10)])
+        pop_queued(queue)
+        requeue(queue, pop_queued(queue))
+        expected = list(range(2, 2 + RELEARN_AFTER)) + [1] + list(range(2 + RELEARN_AFTER, 10))
+        self.assertEqual(self.pop_all(queue), expected)
+
+    def test_missed_clip_stays_with_its_format(self):
+        playlist = [make_clip(0), make_clip(1), make_clip(2, Format.EXPRESSIVE), make_clip(3, Format.EXPRESSIVE)]
+        queue = queue_playlist(playlist)
+        pop_queued(queue)
+        requeue(queue, pop_queued(queue))
+        self.assertEqual(self.pop_all(queue), [1, 2, 3])
+
+
+if __name__ == '__main__':
+    unittest.main()
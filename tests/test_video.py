@@ -0,0 +1,65 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from flask import Flask
+
+from src import blobs, clips, manifest, video
+from src.clips import DEFAULT_TENANT, ClipCatalog
+
+
+class ServeClipTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        src = Path(tmp.name)
+        self.clip = src / 'static' / 'receptive' / 'pack' / 'a.mp4'
+        self.clip.parent.mkdir(parents=True)
+        self.clip.write_bytes(bytes(range(100)))
+
+        for target, name, value in [
+            (manifest, 'SRC_DIR', src),
+            (manifest, 'RENDITIONS_DIR', src / 'renditions'),
+            (video, 'SRC_DIR', src),
+            (blobs, 'BLOB_DIR', src / 'blobs'),
+        ]:
+            patcher = mock.patch.object(target, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        catalog = ClipCatalog(manifest.scan(None, src / 'static')['clips'])
+        patcher = mock.patch.dict(clips._catalogs, {DEFAULT_TENANT: catalog})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.url = '/' + clips.file_url(catalog.entries()[0])
+        app = Flask(__name__)
+        app.register_blueprint(video.video)
+        self.client = app.test_client()
+
+    def test_serves_the_clip_as_immutable(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, bytes(range(100)))
+        self.assertIn('immutable', response.headers['Cache-Control'])
+
+    def test_answers_range_and_conditional_requests(self):
+        response = self.client.get(self.url, headers={'Range': 'bytes=10-19'})
+        self.assertEqual((response.status_code, response.data), (206, bytes(range(10, 20))))
+
+        etag = self.client.get(self.url).headers['ETag']
+        self.assertEqual(self.client.get(self.url, headers={'If-None-Match': etag}).status_code, 304)
+
+    def test_unknown_digests_and_extensions_are_not_found(self):
+        self.assertEqual(self.client.get('/video/0123456789abcdef0123.mp4').status_code, 404)
+        self.assertEqual(self.client.get(self.url.replace('.mp4', '.ts')).status_code, 404)
+
+    def test_overwritten_clip_is_not_served_under_its_old_url(self):
+        self.clip.write_bytes(bytes(50))
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
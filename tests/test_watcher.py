@@ -0,0 +1,76 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from src import watcher
+from src.watcher import EVENT_HEADER, IN_ISDIR, IN_MOVED_FROM, IN_Q_OVERFLOW, CatalogWatcher
+
+
+class FakeLibc:
+    '''
+        Hands out watch descriptors for `inotify_add_watch`, so events can be written to a pipe instead
+    '''
+
+    def __init__(self):
+        self.watched = {}
+
+    def inotify_add_watch(self, fd: int, path: bytes, mask: int) -> int:
+        return self.watched.setdefault(os.fsdecode(path), len(self.watched) + 1)
+
+
+def event(wd: int, mask: int, name: str = '') -> bytes:
+    # names are padded with NULs to a multiple of 16 bytes
+    encoded = name.encode().ljust((len(name) // 16 + 1) * 16, b'\0') if name else b''
+    return EVENT_HEADER.pack(wd, mask, 0, len(encoded)) + encoded
+
+
+class InotifyTest(unittest.TestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = Path(tmp.name) / 'static'
+        (self.root / 'receptive' / 'pack').mkdir(parents=True)
+
+        patcher = mock.patch.object(watcher, 'STATIC_DIR', self.root)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.libc = FakeLibc()
+        self.read_fd, self.write_fd = os.pipe()
+        os.set_blocking(self.read_fd, False)
+        self.addCleanup(os.close, self.write_fd)
+        self.watcher = CatalogWatcher(interval=0.01)
+
+    def changes(self, data: bytes) -> set:
+        os.write(self.write_fd, data)
+        changes = self.watcher._read_inotify(self.libc, self.read_fd)
+        try:
+            return next(changes)
+        finally:
+            self.watcher.stop()
+            changes.close()
+
+    def test_moved_folder_is_rescanned(self):
+        wd = self.libc.inotify_add_watch(0, os.fsencode(self.root / 'receptive'), 0)
+        self.assertEqual(
+            self.changes(event(wd, IN_MOVED_FROM | IN_ISDIR, 'pack')),
+            {self.root / 'receptive', self.root / 'receptive' / 'pack'},
+        )
+
+    def test_overflow_rescans_the_whole_library(self):
+        gone = self.root / 'expressive' / 'jammer'
+        catalog = mock.Mock(entries=lambda: [{'path': f'{gone.relative_to(self.root.parent)}/a.mp4'}])
+        with mock.patch.object(watcher, 'get_catalog', return_value=catalog), \
+                mock.patch.object(watcher, 'SRC_DIR', self.root.parent), \
+                self.assertLogs(watcher.logger, 'WARNING'):
+            changed = self.changes(event(-1, IN_Q_OVERFLOW))
+
+        self.assertEqual(changed, {self.root, self.root / 'receptive', self.root / 'receptive' / 'pack', gone})
+        self.assertIn(str(self.root / 'receptive' / 'pack'), self.libc.watched)
+
+
+if __name__ == '__main__':
+    unittest.main()